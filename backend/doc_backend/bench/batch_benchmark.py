@@ -0,0 +1,67 @@
+# bench/batch_benchmark.py - N separate /upload calls vs one /upload/batch
+#
+#   cd backend/doc_backend
+#   python -m bench.batch_benchmark --files 500 --embed-latency 0.02
+#
+# Embedding latency is charged per embedding call (a network round trip),
+# which is what cross-file batching saves.
+
+import argparse
+import io
+import time
+import zipfile
+
+from bench.fixtures import FixtureSpec, make_pdf
+from bench.stubs import StubLatency, install_stubs
+
+
+def make_corpus(count: int, pages: int):
+    return [
+        (f"doc-{i:04d}.pdf", make_pdf(FixtureSpec(f"doc-{i}", pages=pages, table_density=0.2, seed=i)))
+        for i in range(count)
+    ]
+
+
+def zip_corpus(corpus) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in corpus:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch vs single upload benchmark")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=2, help="pages per PDF")
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    app = install_stubs(StubLatency(embed=args.embed_latency))
+    from fastapi.testclient import TestClient
+
+    corpus = make_corpus(args.files, args.pages)
+    archive = zip_corpus(corpus)
+
+    with TestClient(app) as client:
+        # TestClient returns after background ingestion finishes
+        start = time.perf_counter()
+        for name, data in corpus:
+            client.post("/api/upload", files={"file": (name, data, "application/pdf")}).raise_for_status()
+        single_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post("/api/upload/batch", files=[("files", ("corpus.zip", archive, "application/zip"))])
+        batch_seconds = time.perf_counter() - start
+        response.raise_for_status()
+        batch = response.json()
+        status = client.get(f"/api/batches/{batch['batch_id']}").json()
+
+    print(f"files:               {args.files} x {args.pages} pages")
+    print(f"separate uploads:    {single_seconds:.2f}s")
+    print(f"one batch upload:    {batch_seconds:.2f}s  (x{single_seconds / batch_seconds:.1f} faster)")
+    print(f"batch job statuses:  {status['counts']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench/embedding_benchmark.py - Embedding throughput and query latency per embedding backend
+#
+#   cd backend/doc_backend
+#   python -m bench.embedding_benchmark --model nomic-embed-text:latest --model nomic-embed-text-v1.5-int8
+#
+# Each model embeds the same synthetic chunks the way ingestion does
+# (EMBED_BATCH_SIZE texts per call, EMBED_CONCURRENCY calls in flight), then
+# embeds single questions the way /query does. The Ollama model needs a
+# running Ollama server; a model that cannot be loaded is reported and skipped.
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fixtures import TOPICS, page_paragraphs
+from bench.run_benchmark import latency_summary, peak_rss_mb
+from config import EMBED_BATCH_SIZE, EMBED_CONCURRENCY
+from embeddings import EMBEDDING_MODELS, create_embedder
+
+
+def make_texts(count: int, seed: int = 5):
+    rng = random.Random(seed)
+    texts = []
+    page = 0
+    while len(texts) < count:
+        texts.extend(page_paragraphs(rng, page))
+        page += 1
+    return texts[:count]
+
+
+def bench_model(name: str, texts, questions):
+    start = time.perf_counter()
+    embedder = create_embedder(name)
+    embedder.embed_query("warm up")
+    load_seconds = time.perf_counter() - start
+
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        vectors = [v for batch in executor.map(embedder.embed_documents, batches) for v in batch]
+    ingest_seconds = time.perf_counter() - start
+    assert len(vectors) == len(texts) and len(vectors[0]) == EMBEDDING_MODELS[name]["dim"]
+
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        embedder.embed_query(question)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "model": name,
+        "backend": EMBEDDING_MODELS[name]["backend"],
+        "dim": EMBEDDING_MODELS[name]["dim"],
+        "load_s": round(load_seconds, 2),
+        "chunks_per_sec": round(len(texts) / ingest_seconds, 1),
+        **latency_summary(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding backend benchmark")
+    parser.add_argument("--model", action="append", choices=list(EMBEDDING_MODELS),
+                        help="model(s) to compare (default: Ollama vs the int8 ONNX nomic model)")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    models = args.model or ["nomic-embed-text:latest", "nomic-embed-text-v1.5-int8"]
+    texts = make_texts(args.chunks)
+    questions = [f"What does the manual say about {TOPICS[i % len(TOPICS)]}?" for i in range(args.queries)]
+
+    header = f"{'model':<30}{'backend':>8}{'dim':>6}{'load s':>8}{'chunks/s':>10}{'q p50 ms':>10}{'q p95 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name in models:
+        try:
+            r = bench_model(name, texts, questions)
+        except Exception as e:
+            print(f"{name:<30} skipped: {e}")
+            continue
+        print(f"{r['model']:<30}{r['backend']:>8}{r['dim']:>6}{r['load_s']:>8}"
+              f"{r['chunks_per_sec']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    print(f"peak RSS: {peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
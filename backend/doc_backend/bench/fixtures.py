@@ -0,0 +1,116 @@
+# bench/fixtures.py - Synthetic PDF generator for benchmarks
+
+import random
+from dataclasses import dataclass
+from typing import List
+
+import pymupdf as fitz
+
+TOPICS = [
+    "revenue", "inventory", "warranty", "shipping", "battery", "calibration",
+    "maintenance", "pressure", "voltage", "firmware", "compliance", "pricing",
+    "installation", "temperature", "throughput", "latency", "storage", "license",
+]
+
+FILLER = [
+    "the", "system", "report", "section", "value", "measured", "annual", "unit",
+    "operator", "should", "check", "during", "before", "after", "each", "quarter",
+    "device", "output", "limit", "service", "customer", "manual", "procedure",
+]
+
+PAGE_RECT = fitz.paper_rect("a4")
+MARGIN = 50
+
+
+@dataclass
+class FixtureSpec:
+    """Shape of a synthetic document"""
+    name: str
+    pages: int
+    table_density: float = 0.0   # fraction of pages carrying a table
+    scanned_ratio: float = 0.0   # fraction of pages rasterised with no text layer
+    scan_dpi: int = 100          # resolution of the rasterised pages
+    seed: int = 7
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    words = rng.choices(FILLER, k=rng.randint(8, 16))
+    words.insert(rng.randrange(len(words)), topic)
+    return " ".join(words).capitalize() + "."
+
+
+def page_paragraphs(rng: random.Random, page_no: int) -> List[str]:
+    topic = TOPICS[page_no % len(TOPICS)]
+    return [
+        " ".join(_sentence(rng, topic) for _ in range(rng.randint(4, 7)))
+        for _ in range(3)
+    ]
+
+
+def _draw_table(page, rng: random.Random, top: float, topic: str) -> float:
+    """Draw a ruled grid table so pymupdf4llm detects it; returns the bottom y"""
+    columns = ["Item", topic.capitalize(), "Units", "Quarter"]
+    rows = [[f"{topic}-{i}", str(rng.randint(10, 999)), rng.choice(["kg", "V", "%", "hrs"]),
+             f"Q{rng.randint(1, 4)}"] for i in range(rng.randint(3, 6))]
+    col_width = (PAGE_RECT.width - 2 * MARGIN) / len(columns)
+    row_height = 18
+    for r, cells in enumerate([columns] + rows):
+        y0 = top + r * row_height
+        for c, cell in enumerate(cells):
+            x0 = MARGIN + c * col_width
+            rect = fitz.Rect(x0, y0, x0 + col_width, y0 + row_height)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_textbox(rect + (3, 3, -3, -3), cell, fontsize=9)
+    return top + (len(rows) + 1) * row_height
+
+
+def _rasterise(doc, page_index: int, dpi: int = 100):
+    """Replace a page by an image of itself, like a scanned page"""
+    pix = doc[page_index].get_pixmap(dpi=dpi)
+    doc.delete_page(page_index)
+    page = doc.new_page(pno=page_index, width=PAGE_RECT.width, height=PAGE_RECT.height)
+    page.insert_image(page.rect, stream=pix.tobytes("png"))
+
+
+def make_pdf(spec: FixtureSpec) -> bytes:
+    """Build the PDF described by `spec` and return its bytes"""
+    rng = random.Random(spec.seed)
+    doc = fitz.open()
+    table_pages = set(rng.sample(range(spec.pages), round(spec.pages * spec.table_density)))
+    scanned_pages = set(rng.sample(range(spec.pages), round(spec.pages * spec.scanned_ratio)))
+
+    for page_no in range(spec.pages):
+        page = doc.new_page(width=PAGE_RECT.width, height=PAGE_RECT.height)
+        y = MARGIN
+        if page_no in table_pages:
+            y = _draw_table(page, rng, y, TOPICS[page_no % len(TOPICS)]) + 20
+        box = fitz.Rect(MARGIN, y, PAGE_RECT.width - MARGIN, PAGE_RECT.height - MARGIN)
+        page.insert_textbox(box, "\n\n".join(page_paragraphs(rng, page_no)), fontsize=10)
+
+    for page_no in sorted(scanned_pages):
+        _rasterise(doc, page_no, spec.scan_dpi)
+
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def questions_for(spec: FixtureSpec, count: int, seed: int = 11) -> List[str]:
+    """Deterministic question mix covering the fixture's topics"""
+    rng = random.Random(seed)
+    topics = [TOPICS[p % len(TOPICS)] for p in range(spec.pages)]
+    templates = [
+        "What does the manual say about {topic}?",
+        "How should the operator check {topic} each quarter?",
+        "Show the table of {topic} values",
+        "Compare the {topic} numbers across quarters",
+    ]
+    return [rng.choice(templates).format(topic=rng.choice(topics)) for _ in range(count)]
+
+
+DEFAULT_FIXTURES = [
+    FixtureSpec("small-text", pages=5),
+    FixtureSpec("medium-mixed", pages=40, table_density=0.3),
+    FixtureSpec("large-tables", pages=120, table_density=0.6),
+    FixtureSpec("scanned", pages=20, scanned_ratio=0.5),
+]
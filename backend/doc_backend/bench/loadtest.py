@@ -0,0 +1,207 @@
+# bench/loadtest.py - Concurrent /query load generator with background upload traffic
+#
+# Drives one in-process app (all services stubbed, latency injected) at several
+# concurrency levels, once with and once without uploads running alongside:
+#
+#   cd backend/doc_backend
+#   python -m bench.loadtest --concurrency 1 4 16 32 --duration 10 \
+#       --table-ratio 0.3 --rerank-latency 0.15 --llm-latency 0.6
+#
+# Reports throughput, p50/p95/p99 per query type and event-loop lag, plus the
+# slowdown uploads cause. Throughput that stops growing with concurrency while
+# loop lag stays low means the process is saturated: add workers, not threads.
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+
+from bench.fixtures import TOPICS, FixtureSpec, make_pdf
+from bench.run_benchmark import latency_summary, percentile
+from bench.stubs import StubLatency, install_stubs
+
+TEXT_TEMPLATES = [
+    "What does the manual say about {topic}?",
+    "How should the operator handle {topic} during service?",
+    "Explain the {topic} procedure",
+]
+
+TABLE_TEMPLATES = [
+    "Show the table of {topic} values",
+    "Compare the {topic} numbers per quarter",
+    "List the {topic} statistics",
+]
+
+
+class QuestionMix:
+    """Weighted text/table question generator (table ones hit TABLE_KEYWORDS)"""
+
+    def __init__(self, table_ratio: float, seed: int = 3):
+        from query import is_table_query
+
+        self.table_ratio = table_ratio
+        self.rng = random.Random(seed)
+        for template in TABLE_TEMPLATES:
+            assert is_table_query(template), f"not detected as table query: {template}"
+        for template in TEXT_TEMPLATES:
+            assert not is_table_query(template), f"detected as table query: {template}"
+
+    def next(self):
+        kind = "table" if self.rng.random() < self.table_ratio else "text"
+        templates = TABLE_TEMPLATES if kind == "table" else TEXT_TEMPLATES
+        question = self.rng.choice(templates).format(topic=self.rng.choice(TOPICS))
+        return kind, question
+
+
+async def monitor_loop_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.01):
+    """Measure how late the event loop wakes a sleeping coroutine"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def upload_traffic(client, stop: asyncio.Event, pdf_bytes: bytes, counter: Dict):
+    """Keep one upload in flight at all times until stopped"""
+    while not stop.is_set():
+        response = await client.post(
+            "/api/upload",
+            files={"file": ("load.pdf", pdf_bytes, "application/pdf")},
+        )
+        counter["uploads"] += 1
+        if response.status_code != 200:
+            counter["upload_errors"] += 1
+
+
+async def query_worker(client, collection: str, mix: QuestionMix, deadline: float, results: Dict):
+    while time.perf_counter() < deadline:
+        kind, question = mix.next()
+        start = time.perf_counter()
+        response = await client.post("/api/query", json={"question": question, "collection": collection})
+        elapsed = time.perf_counter() - start
+        if response.status_code == 200:
+            results[kind].append(elapsed)
+        else:
+            results["errors"] += 1
+
+
+async def run_level(app, collection: str, concurrency: int, duration: float,
+                    mix: QuestionMix, upload_pdf: bytes = None) -> Dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    results = {"text": [], "table": [], "errors": 0}
+    counter = {"uploads": 0, "upload_errors": 0}
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        background = [asyncio.create_task(monitor_loop_lag(stop, lag_samples))]
+        if upload_pdf is not None:
+            background.append(asyncio.create_task(upload_traffic(client, stop, upload_pdf, counter)))
+
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[
+            query_worker(client, collection, mix, deadline, results) for _ in range(concurrency)
+        ])
+        wall = time.perf_counter() - start
+
+        stop.set()
+        await asyncio.gather(*background)
+
+    all_latencies = results["text"] + results["table"]
+    return {
+        "concurrency": concurrency,
+        "uploads_running": upload_pdf is not None,
+        "requests": len(all_latencies),
+        "errors": results["errors"],
+        "throughput_rps": round(len(all_latencies) / wall, 2),
+        "all": latency_summary(all_latencies),
+        "text": latency_summary(results["text"]),
+        "table": latency_summary(results["table"]),
+        "loop_lag_p99_ms": round(percentile(lag_samples, 99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lag_samples, default=0.0) * 1000, 2),
+        "uploads_completed": counter["uploads"],
+    }
+
+
+def print_report(rows: List[Dict]):
+    header = (f"{'conc':>5}{'uploads':>9}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'tbl p95':>9}{'lag p99':>9}{'lag max':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['concurrency']:>5}{'yes' if r['uploads_running'] else 'no':>9}{r['throughput_rps']:>8}"
+              f"{r['all']['p50_ms']:>9}{r['all']['p95_ms']:>9}{r['all']['p99_ms']:>9}"
+              f"{r['table']['p95_ms']:>9}{r['loop_lag_p99_ms']:>9}{r['loop_lag_max_ms']:>9}")
+
+    quiet = {r["concurrency"]: r for r in rows if not r["uploads_running"]}
+    busy = {r["concurrency"]: r for r in rows if r["uploads_running"]}
+    print("\nUpload interference (p95 with uploads / without):")
+    for level in sorted(quiet):
+        if level in busy and quiet[level]["all"]["p95_ms"]:
+            ratio = busy[level]["all"]["p95_ms"] / quiet[level]["all"]["p95_ms"]
+            print(f"  concurrency {level:>4}: x{ratio:.2f}")
+
+    if quiet:
+        best = max(r["throughput_rps"] for r in quiet.values())
+        knee = min(level for level, r in quiet.items() if r["throughput_rps"] >= 0.9 * best)
+        print(f"\nThroughput saturates at ~{best} req/s from concurrency {knee}; "
+              f"size workers for expected peak concurrent users / {knee}.")
+
+
+async def run(args):
+    latency = StubLatency(
+        embed=args.embed_latency,
+        rerank=args.rerank_latency,
+        llm=args.llm_latency,
+        ocr=args.ocr_latency,
+    )
+    app = install_stubs(latency)
+
+    import httpx
+
+    corpus = make_pdf(FixtureSpec("loadtest-corpus", pages=args.corpus_pages, table_density=0.3))
+    upload_pdf = make_pdf(FixtureSpec("loadtest-upload", pages=args.upload_pages,
+                                      table_density=0.3, scanned_ratio=0.2, seed=13))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+        response = await client.post("/api/upload", files={"file": ("corpus.pdf", corpus, "application/pdf")})
+        response.raise_for_status()
+        collection = response.json()["collection"]
+
+    rows = []
+    for concurrency in args.concurrency:
+        for with_uploads in (False, True):
+            mix = QuestionMix(args.table_ratio)
+            rows.append(await run_level(app, collection, concurrency, args.duration, mix,
+                                        upload_pdf if with_uploads else None))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DocuSleuth concurrent query load test")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--table-ratio", type=float, default=0.3, help="share of table questions")
+    parser.add_argument("--corpus-pages", type=int, default=60)
+    parser.add_argument("--upload-pages", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--rerank-latency", type=float, default=0.15)
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--ocr-latency", type=float, default=0.2)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    rows = asyncio.run(run(args))
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
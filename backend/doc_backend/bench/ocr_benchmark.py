@@ -0,0 +1,81 @@
+# bench/ocr_benchmark.py - OCR throughput: legacy per-image path vs the batched page OCR engine
+#
+#   cd backend/doc_backend
+#   python -m bench.ocr_benchmark --pages 40 --workers 4 --dpi 200
+#
+# Runs real EasyOCR on CPU (models are downloaded on first use) over a fully
+# scanned synthetic document rasterised at 300 DPI. The legacy path is the
+# previous ingestion code: embedded images extracted at native resolution and
+# read one at a time by a single en+hi reader. The new path is
+# ocr.recognize_pages with the given DPI, worker count and languages.
+
+import argparse
+import os
+import time
+
+
+def legacy_ocr(pdf_doc, page_indexes, languages):
+    from easyocr import Reader
+    reader = Reader(languages, gpu=False, verbose=False)
+    texts = {}
+    for page_index in page_indexes:
+        parts = []
+        for img in pdf_doc[page_index].get_images(full=True):
+            image_bytes = pdf_doc.extract_image(img[0]).get("image")
+            if image_bytes:
+                parts.append(" ".join(reader.readtext(image_bytes, detail=0)))
+        texts[page_index] = "\n".join(parts).strip()
+    return texts
+
+
+def report(label: str, texts, seconds: float):
+    chars = sum(len(text) for text in texts.values())
+    print(f"{label:<10}{len(texts) / seconds:>12.2f}{seconds:>12.1f}{chars:>12}")
+    return len(texts) / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR benchmark")
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--dpi", type=int, default=200, help="OCR_DPI for the new path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="OCR_WORKERS for the new path")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--languages", default="en,hi")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args(argv)
+
+    # config reads these at import
+    os.environ.update(OCR_DPI=str(args.dpi), OCR_WORKERS=str(args.workers),
+                      OCR_BATCH_SIZE=str(args.batch_size), OCR_GPU="0")
+    import pymupdf as fitz
+    import ocr
+    from bench.fixtures import FixtureSpec, make_pdf
+
+    languages = [code.strip() for code in args.languages.split(",") if code.strip()]
+    spec = FixtureSpec("scanned", pages=args.pages, scanned_ratio=1.0, scan_dpi=300)
+    print(f"building {args.pages}-page scanned fixture...")
+    pdf_doc = fitz.open(stream=make_pdf(spec), filetype="pdf")
+    page_indexes = list(range(pdf_doc.page_count))
+
+    print(f"{'path':<10}{'pages/s':>12}{'seconds':>12}{'chars':>12}")
+    legacy_rate = None
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        texts = legacy_ocr(pdf_doc, page_indexes, languages)
+        legacy_rate = report("legacy", texts, time.perf_counter() - start)
+
+    try:
+        # Warm the pool (process start, model load) outside the timing
+        ocr.recognize_pages(pdf_doc, page_indexes[:1], languages)
+        start = time.perf_counter()
+        texts = ocr.recognize_pages(pdf_doc, page_indexes, languages)
+        rate = report("batched", texts, time.perf_counter() - start)
+    finally:
+        ocr.shutdown_pool()
+    if legacy_rate:
+        print(f"speedup: {rate / legacy_rate:.2f}x "
+              f"(dpi={args.dpi}, workers={args.workers}, batch={args.batch_size})")
+
+
+if __name__ == "__main__":
+    main()
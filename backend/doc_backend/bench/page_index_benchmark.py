@@ -0,0 +1,97 @@
+# bench/page_index_benchmark.py - Flat chunk search vs coarse-to-fine page search on a large document
+#
+#   cd backend/doc_backend
+#   python -m bench.page_index_benchmark --pages 3000 --queries 100
+#
+# Ingests one synthetic manual (page topics cycle through TOPICS, so the
+# pages relevant to a question are known), then runs the same questions with
+# the page index disabled and enabled. Candidate quality is the share of
+# retrieved chunks that come from a page about the asked topic; scatter is
+# the number of distinct pages among the candidates.
+
+import argparse
+import time
+
+from bench.fixtures import TOPICS, FixtureSpec, make_pdf, questions_for
+from bench.run_benchmark import latency_summary
+from bench.stubs import StubLatency, install_stubs
+
+
+def page_topic(page: int) -> str:
+    # Fixture pages are generated 0-based, chunk metadata is 1-based
+    return TOPICS[(page - 1) % len(TOPICS)]
+
+
+def question_topic(question: str) -> str:
+    return next(topic for topic in TOPICS if topic in question)
+
+
+def run_mode(client, query, collection: str, questions, page_candidates: int, k: int):
+    query.PAGE_CANDIDATES = page_candidates
+    search_latencies, query_latencies = [], []
+    precision, scatter = [], []
+    for question in questions:
+        start = time.perf_counter()
+        vector = query.embedding_model.embed_query(question)
+        docs = [doc for doc, _ in query.retrieve_candidates(collection, vector, k)]
+        search_latencies.append(time.perf_counter() - start)
+
+        topic = question_topic(question)
+        pages = [doc.metadata.get("page") for doc in docs]
+        precision.append(sum(page_topic(p) == topic for p in pages) / len(pages) if pages else 0.0)
+        scatter.append(len(set(pages)))
+
+        start = time.perf_counter()
+        client.post("/api/query", json={"question": question, "collection": collection}).raise_for_status()
+        query_latencies.append(time.perf_counter() - start)
+
+    return {
+        "search": latency_summary(search_latencies),
+        "query": latency_summary(query_latencies),
+        "topic_precision": round(sum(precision) / len(precision), 3),
+        "distinct_pages": round(sum(scatter) / len(scatter), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Page index benchmark")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10, help="chunk candidates per query")
+    parser.add_argument("--page-candidates", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    app = install_stubs(StubLatency())
+    import query
+    from fastapi.testclient import TestClient
+
+    spec = FixtureSpec("large-manual", pages=args.pages, table_density=0.1)
+    print(f"building {args.pages}-page fixture...")
+    pdf_bytes = make_pdf(spec)
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        response = client.post("/api/upload", files={"file": ("manual.pdf", pdf_bytes, "application/pdf")})
+        response.raise_for_status()
+        ingest_seconds = time.perf_counter() - start
+        upload = response.json()
+        job = client.get(f"/api/jobs/{upload['job_id']}").json()
+        if job["status"] != "completed":
+            raise SystemExit(f"ingestion failed: {job}")
+
+        questions = [q for q in questions_for(spec, args.queries) if any(t in q for t in TOPICS)]
+        flat = run_mode(client, query, upload["collection"], questions, 0, args.k)
+        coarse = run_mode(client, query, upload["collection"], questions, args.page_candidates, args.k)
+
+    print(f"ingestion:         {ingest_seconds:.1f}s, {job['chunks']} chunks")
+    print(f"{'':18}{'flat':>12}{'coarse':>12}")
+    for label, key in (("search p50 ms", "p50_ms"), ("search p95 ms", "p95_ms")):
+        print(f"{label:<18}{flat['search'][key]:>12}{coarse['search'][key]:>12}")
+    for label, key in (("query p50 ms", "p50_ms"), ("query p95 ms", "p95_ms")):
+        print(f"{label:<18}{flat['query'][key]:>12}{coarse['query'][key]:>12}")
+    print(f"{'topic precision':<18}{flat['topic_precision']:>12}{coarse['topic_precision']:>12}")
+    print(f"{'distinct pages':<18}{flat['distinct_pages']:>12}{coarse['distinct_pages']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench/run_benchmark.py - Offline end-to-end benchmark of /upload and /query
+#
+# Runs the real FastAPI app with every remote service stubbed (see bench/stubs.py):
+#
+#   cd backend/doc_backend
+#   python -m bench.run_benchmark --queries 50 --llm-latency 0.05 --json bench_output.json
+#
+# Reports ingestion pages/sec, query p50/p95/p99, /summarize cold vs cached
+# latency and peak RSS per fixture.
+
+import argparse
+import json
+import math
+import resource
+import sys
+import time
+from typing import Dict, List
+
+from bench.fixtures import DEFAULT_FIXTURES, FixtureSpec, make_pdf, questions_for
+from bench.stubs import StubLatency, install_stubs
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run_fixture(client, spec: FixtureSpec, query_count: int) -> Dict:
+    pdf_bytes = make_pdf(spec)
+
+    # TestClient returns only after background tasks finish, so this
+    # measures the full ingestion, not just the upload handshake.
+    start = time.perf_counter()
+    response = client.post(
+        "/api/upload",
+        files={"file": (f"{spec.name}.pdf", pdf_bytes, "application/pdf")},
+    )
+    ingest_seconds = time.perf_counter() - start
+    response.raise_for_status()
+    collection = response.json()["collection"]
+
+    latencies = []
+    for question in questions_for(spec, query_count):
+        start = time.perf_counter()
+        response = client.post("/api/query", json={"question": question, "collection": collection})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+    # Map-reduce summary: cold, repeated (cached) and a partial page range
+    summary_times = []
+    half = max(1, spec.pages // 2)
+    for payload in ({}, {}, {"page_start": 1, "page_end": half}):
+        start = time.perf_counter()
+        response = client.post("/api/summarize", json={"collection": collection, **payload})
+        summary_times.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+    return {
+        "fixture": spec.name,
+        "pages": spec.pages,
+        "table_density": spec.table_density,
+        "scanned_ratio": spec.scanned_ratio,
+        "pdf_kb": round(len(pdf_bytes) / 1024, 1),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "pages_per_sec": round(spec.pages / ingest_seconds, 2) if ingest_seconds else 0.0,
+        "queries": query_count,
+        **latency_summary(latencies),
+        "summary_cold_ms": round(summary_times[0] * 1000, 2),
+        "summary_cached_ms": round(summary_times[1] * 1000, 2),
+        "summary_partial_ms": round(summary_times[2] * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def print_report(results: List[Dict]):
+    header = f"{'fixture':<16}{'pages':>6}{'pages/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['fixture']:<16}{r['pages']:>6}{r['pages_per_sec']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['peak_rss_mb']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline DocuSleuth benchmark")
+    parser.add_argument("--queries", type=int, default=30, help="queries per fixture")
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--rerank-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--ocr-latency", type=float, default=0.0)
+    parser.add_argument("--fixture", action="append", help="only run the named fixture(s)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    latency = StubLatency(
+        embed=args.embed_latency,
+        rerank=args.rerank_latency,
+        llm=args.llm_latency,
+        ocr=args.ocr_latency,
+    )
+    app = install_stubs(latency)
+
+    from fastapi.testclient import TestClient
+
+    fixtures = [f for f in DEFAULT_FIXTURES if not args.fixture or f.name in args.fixture]
+    results = []
+    with TestClient(app) as client:
+        for spec in fixtures:
+            results.append(run_fixture(client, spec, args.queries))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
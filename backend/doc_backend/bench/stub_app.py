@@ -0,0 +1,38 @@
+# bench/stub_app.py - Stubbed app for multi-process benchmarks
+#
+#   python serve.py --app bench.stub_app:app --workers 4
+#
+# Every worker process imports this module: it installs the stubs (latency
+# from BENCH_*_LATENCY) and ingests the same deterministic fixture into an
+# in-memory Qdrant collection named BENCH_COLLECTION, so all workers serve
+# identical data.
+
+import os
+
+from bench.fixtures import FixtureSpec, make_pdf
+from bench.stubs import StubLatency, install_stubs
+
+BENCH_COLLECTION = os.getenv("BENCH_COLLECTION", "bench_fixture")
+
+app = install_stubs(StubLatency(
+    embed=float(os.getenv("BENCH_EMBED_LATENCY", 0)),
+    rerank=float(os.getenv("BENCH_RERANK_LATENCY", 0)),
+    llm=float(os.getenv("BENCH_LLM_LATENCY", 0)),
+))
+
+
+@app.get("/bench/pid")
+def worker_pid():
+    return {"pid": os.getpid()}
+
+
+def ingest_fixture():
+    from jobs import create_job
+    from uploadv1 import ingest_documents
+
+    spec = FixtureSpec("worker-bench", pages=int(os.getenv("BENCH_PAGES", 20)), table_density=0.3)
+    job = create_job(f"{spec.name}.pdf", BENCH_COLLECTION)
+    ingest_documents([(job, make_pdf(spec))])
+
+
+ingest_fixture()
@@ -0,0 +1,190 @@
+# bench/stubs.py - Deterministic local stand-ins for Ollama, Qdrant, Cohere, Gemini and EasyOCR
+#
+# install_stubs() must run before `main` (or any router module) is imported:
+# query.py and uploadv1.py bind `embedding_model` / `qdrant_client` at import.
+# `config` may already be loaded (serve.py or a test reads it); it is re-read
+# once the benchmark settings are in the environment.
+
+import hashlib
+import importlib
+import math
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclass
+class StubLatency:
+    """Injected latency (seconds) per simulated remote call"""
+    embed: float = 0.0        # per embed call (query or batch)
+    rerank: float = 0.0       # per co.rerank call
+    llm: float = 0.0          # per generate_content call
+    ocr: float = 0.0          # per readtext call
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Bag-of-words feature hashing embedder.
+    Texts sharing words land close together, so retrieval stays meaningful.
+    """
+
+    def __init__(self, dim: int = 768, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeReranker:
+    """Mimics cohere.Client.rerank using query/document token overlap"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def rerank(self, query: str, documents: List[str], top_n: int = 3, model: str = None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        query_tokens = set(tokenize(query))
+        scored = []
+        for index, doc in enumerate(documents):
+            doc_tokens = set(tokenize(doc))
+            overlap = len(query_tokens & doc_tokens) / (len(query_tokens) or 1)
+            scored.append(SimpleNamespace(index=index, relevance_score=round(overlap, 4)))
+        scored.sort(key=lambda r: r.relevance_score, reverse=True)
+        return SimpleNamespace(results=scored[:top_n])
+
+
+class _FakeModels:
+    def __init__(self, llm: "FakeLLM"):
+        self._llm = llm
+
+    def generate_content(self, model: str, contents, config=None, **kwargs):
+        return self._llm.generate(contents, config)
+
+
+class FakeLLM:
+    """
+    Mimics google.genai.Client: `client.models.generate_content(...)`.
+    Echoes the first context lines so answers are deterministic.
+    """
+
+    def __init__(self, latency: float = 0.0, output_tokens: int = 64):
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self.models = _FakeModels(self)
+        self.calls = 0
+
+    def generate(self, contents, config=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = contents if isinstance(contents, str) else str(contents)
+        prompt_tokens = len(tokenize(prompt))
+        context = prompt.split("Context from documents:", 1)[-1]
+        words = tokenize(context)[: self.output_tokens]
+        return SimpleNamespace(
+            text=" ".join(words) or "stub answer",
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=len(words),
+            ),
+        )
+
+
+class FakeOCRReader:
+    """Mimics easyocr.Reader.readtext/readtext_batched(detail=0)"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def readtext(self, image, detail: int = 0, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        size = len(image) if isinstance(image, (bytes, bytearray)) else getattr(image, "size", 0)
+        return [f"scanned text block {size % 997}"]
+
+    def readtext_batched(self, images, detail: int = 0, **kwargs):
+        return [self.readtext(image, detail=detail) for image in images]
+
+
+def install_stubs(latency: StubLatency = None, dim: int = 768):
+    """
+    Swap every external service for a local stand-in and return the FastAPI app
+    """
+    latency = latency or StubLatency()
+    if "main" in sys.modules or "query" in sys.modules:
+        raise RuntimeError("install_stubs() must be called before importing main/query")
+
+    # The SDK clients are created at import and refuse an empty key
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("COHERE_API_KEY", "offline-benchmark")
+
+    # The fakes have no quota; leave the client-side buckets wide open so the
+    # benchmarks measure the pipeline, not throttling and quota fallbacks
+    for name in ("COHERE_CALLS_PER_DAY", "COHERE_CALLS_PER_MONTH",
+                 "GEMINI_REQUESTS_PER_MINUTE", "GEMINI_REQUESTS_PER_DAY"):
+        os.environ.setdefault(name, str(10 ** 9))
+
+    # Keep benchmark collections out of the on-disk registry
+    os.environ.setdefault("REGISTRY_DB_PATH", ":memory:")
+    os.environ.setdefault("TABLE_DB_PATH", ":memory:")
+    os.environ.setdefault("SHARED_CACHE_PATH", ":memory:")
+    os.environ.setdefault("JOB_DB_PATH", ":memory:")
+    os.environ.setdefault("QUOTA_DB_PATH", ":memory:")
+    # Benchmarks measure the pipeline, not the answer cache
+    os.environ.setdefault("ANSWER_CACHE_TTL", "0")
+    # OCR inline, so the fake reader is used instead of worker processes
+    os.environ.setdefault("OCR_WORKERS", "0")
+    if "config" in sys.modules:
+        importlib.reload(sys.modules["config"])
+
+    import embeddings
+    embeddings.embedding_model = HashEmbeddings(dim=dim, latency=latency.embed)
+    embeddings.embedding_dim = dim
+    embeddings.qdrant_client = QdrantClient(":memory:")
+
+    import main
+    import ocr
+    import query
+
+    query.co = FakeReranker(latency=latency.rerank)
+    query.gemini_client = FakeLLM(latency=latency.llm)
+    ocr_reader = FakeOCRReader(latency=latency.ocr)
+    ocr.reader_factory = lambda languages: ocr_reader
+
+    return main.app
@@ -0,0 +1,157 @@
+# bench/worker_scaling.py - /query throughput from 1 to N worker processes
+#
+#   cd backend/doc_backend
+#   python -m bench.worker_scaling --workers 1 2 4 8 --concurrency 32 --duration 15 --llm-latency 0.05
+#
+# Starts serve.py with the stubbed app (bench/stub_app.py) for every worker
+# count and cache mode, drives it over real HTTP with a fixed question pool,
+# and reports throughput, latency and answer-cache hit rate. "shared" uses
+# one SQLite cache file for all workers; "per-process" gives every worker
+# its own in-memory cache, which is what per-process dicts amount to.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench.fixtures import TOPICS
+from bench.run_benchmark import latency_summary
+
+COLLECTION = "bench_fixture"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES = [
+    "What does the manual say about {topic}?",
+    "How should the operator check {topic} each quarter?",
+    "Show the table of {topic} values",
+]
+
+
+def question_pool(size: int, seed: int = 9):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS)) + f" (variant {i % 7})" for i in range(size)]
+
+
+def start_server(workers: int, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "serve.py", "--app", "bench.stub_app:app", "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_workers(base_url: str, workers: int, timeout: float = 300):
+    """Poll on fresh connections until every worker has answered once"""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while len(seen) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"only {len(seen)}/{workers} workers came up")
+        try:
+            seen.add(httpx.get(f"{base_url}/bench/pid", timeout=2).json()["pid"])
+        except httpx.HTTPError:
+            time.sleep(0.5)
+
+
+async def drive(base_url: str, questions, concurrency: int, duration: float, collection: str):
+    latencies, cached = [], 0
+    errors = 0
+    stop_at = time.perf_counter() + duration
+    rng = random.Random(1)
+
+    async def user(client):
+        nonlocal cached, errors
+        while time.perf_counter() < stop_at:
+            question = rng.choice(questions)
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/query", json={"question": question, "collection": collection})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if json.loads(response.json()["response"]).get("cached"):
+                cached += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+    return latencies, cached, errors
+
+
+def run(workers: int, mode: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "BENCH_LLM_LATENCY": str(args.llm_latency),
+            "BENCH_RERANK_LATENCY": str(args.rerank_latency),
+            "BENCH_EMBED_LATENCY": str(args.embed_latency),
+            "BENCH_COLLECTION": COLLECTION,
+            "ANSWER_CACHE_TTL": "3600",
+            "SHARED_CACHE_PATH": os.path.join(tmp, "cache.db") if mode == "shared" else ":memory:",
+            "LOG_FILE": "",
+            "LOG_LEVEL": "WARNING",
+        }
+        server = start_server(workers, args.port, env)
+        base_url = f"http://127.0.0.1:{args.port}"
+        try:
+            wait_for_workers(base_url, workers)
+            latencies, cached, errors = asyncio.run(
+                drive(base_url, question_pool(args.questions), args.concurrency, args.duration, COLLECTION)
+            )
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait(timeout=60)
+
+    return {
+        "workers": workers,
+        "cache": mode,
+        "rps": round(len(latencies) / args.duration, 1),
+        "hit_rate": round(cached / len(latencies), 3) if latencies else 0.0,
+        "errors": errors,
+        **latency_summary(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--questions", type=int, default=200, help="size of the question pool")
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--rerank-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    header = f"{'workers':>8}{'cache':>13}{'req/s':>9}{'hit rate':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for workers in args.workers:
+        for mode in ("per-process", "shared"):
+            r = run(workers, mode, args)
+            results.append(r)
+            print(f"{r['workers']:>8}{r['cache']:>13}{r['rps']:>9}{r['hit_rate']:>10}"
+                  f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['errors']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -41,12 +41,40 @@ GEMINI_TOP_K = 40
 # ========================================
 INITIAL_RETRIEVAL_K = 10  # Candidates before reranking
 FINAL_DOCS_K = 3  # Documents for answer generation
+ADAPTIVE_K_MAX_FACTOR = 2  # Search up to this multiple of the usual k, then cut by score
+ADAPTIVE_SCORE_WINDOW = float(os.getenv("ADAPTIVE_SCORE_WINDOW", 0.12))  # Keep hits within this cosine distance of the best
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", 0.08))  # Skip the rerank when the top hits lead the rest by this much
+DENSE_MIN_SCORE = float(os.getenv("DENSE_MIN_SCORE", 0.55))  # Cosine floor for using dense hits without a rerank
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # Estimated tokens of context sent to the LLM
+CONTEXT_MERGE_GAP = 0  # Merge same-page chunks separated by at most this many chars
+PAGE_INDEX_MIN_PAGES = int(os.getenv("PAGE_INDEX_MIN_PAGES", 50))  # Build page vectors for documents this long
+PAGE_INDEX_SUFFIX = "__pages"  # Page vectors live in "<collection>__pages"
+PAGE_CANDIDATES = 8  # Pages kept by the coarse search before the chunk search
+PAGE_INDEX_RECHECK_SECONDS = 30  # A missing page index is looked up again after this (it is built last)
+TABLE_DB_PATH = os.getenv("TABLE_DB_PATH", "tables.db")  # Typed copies of ingested tables
+TABLE_FAST_PATH = os.getenv("TABLE_FAST_PATH", "1") != "0"  # Answer direct table lookups without the LLM
+TABLE_MIN_COVERAGE = float(os.getenv("TABLE_MIN_COVERAGE", 0.75))  # Share of the question's words a table answer must match
+
+# ========================================
+# Summarization Settings
+# ========================================
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))  # Parallel LLM calls per summary
+SUMMARY_REDUCE_FANIN = 8  # Section summaries combined per reduce step
+SUMMARY_PAGES_PER_CALL = 4  # Pages summarized per map call (aligned blocks: 1-4, 5-8, ...)
+SUMMARY_PAGE_TOKEN_LIMIT = 3000  # Estimated input tokens per page summary
+SUMMARY_LLM_TIMEOUT = 120.0  # Seconds a summary call may queue for Gemini quota
+SUMMARY_MAX_LLM_CALLS = int(os.getenv("SUMMARY_MAX_LLM_CALLS", 300))  # Larger ranges must be requested in parts
+SUMMARY_QUOTA_RESERVE = float(os.getenv("SUMMARY_QUOTA_RESERVE", 0.3))  # Share of every Gemini window summaries leave to /query
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600))  # Seconds section summaries are kept; 0 disables
 
 # ========================================
 # Local Models (Embeddings only)
 # ========================================
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_EMBEDDING_MODEL = "nomic-embed-text:latest"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", OLLAMA_EMBEDDING_MODEL)  # Any key of embeddings.EMBEDDING_MODELS
+ONNX_BATCH_SIZE = 32  # Texts per ONNX inference call
+ONNX_MAX_LENGTH = 512  # Tokens per text (longer texts are truncated)
 
 # ========================================
 # Qdrant Settings
@@ -64,8 +92,57 @@ CHUNK_OVERLAP = 200  # Good overlap for continuity
 # ========================================
 # Upload Settings
 # ========================================
-UPLOAD_DIR = "uploads"
 BATCH_SIZE = 20
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+MAX_UPLOAD_PAGES = int(os.getenv("MAX_UPLOAD_PAGES", 2000))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 1000))  # PDFs per /upload/batch request
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_MB", 1024)) * 1024 * 1024  # Per uploaded file or archive in a batch
+MAX_BATCH_TOTAL_BYTES = int(os.getenv("MAX_BATCH_TOTAL_MB", 2048)) * 1024 * 1024  # Whole batch request, and the PDFs extracted from it
+# Cores per server process: serve.py runs WEB_CONCURRENCY processes per host
+WORKER_CPUS = max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", 1)))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", WORKER_CPUS))  # PDF parsing processes per server process; 0 = inline
+OCR_DPI = int(os.getenv("OCR_DPI", 200))  # Scanned pages are rendered (downsampled) to this resolution
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", 8))  # Pages per recognizer batch
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", WORKER_CPUS))  # OCR processes per server process; 0 = inline
+OCR_MAX_READERS = int(os.getenv("OCR_MAX_READERS", 2))  # Language sets kept loaded per OCR process (least recently used go)
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "en,hi").split(",")  # Default; uploads may pass their own
+OCR_GPU = os.getenv("OCR_GPU", "0") == "1"
+EMBED_BATCH_SIZE = 64  # Chunks per embedding call (may span several files)
+EMBED_CONCURRENCY = 4  # Embedding calls in flight during ingestion
+# onnxruntime intra-op threads per call: concurrent embedding calls share this process's cores
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", max(1, WORKER_CPUS // EMBED_CONCURRENCY)))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")  # Ingestion jobs, readable from every worker
+JOB_RETENTION_SECONDS = 24 * 3600  # Finished ingestion jobs are kept this long
+
+# ========================================
+# Collection Lifecycle
+# ========================================
+REGISTRY_DB_PATH = os.getenv("REGISTRY_DB_PATH", "collections.db")
+COLLECTION_TTL_SECONDS = int(os.getenv("COLLECTION_TTL_HOURS", 72)) * 3600  # Idle time before eviction
+GC_INTERVAL_SECONDS = 15 * 60
+GC_MODE = os.getenv("GC_MODE", "delete")  # "delete" or "archive" (Qdrant snapshot, then delete)
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_HOURS", 6)) * 3600  # Collections still "ingesting" after this are swept
+REGISTRY_TOUCH_INTERVAL = 60  # Seconds between last-query writes per collection
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # /api/admin/* requires X-Admin-Token; disabled while unset
+
+# ========================================
+# Serving (serve.py)
+# ========================================
+SERVE_HOST = os.getenv("HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("PORT", 8000))
+SERVE_WORKERS = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+SHUTDOWN_DRAIN_SECONDS = int(os.getenv("SHUTDOWN_DRAIN_SECONDS", 120))  # Wait this long for running ingestion on shutdown
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "1") != "0"  # Load the embedding model before serving
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.db")  # Cache shared by all workers
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))  # Seconds; 0 disables the answer cache
+QUERY_EMBED_CACHE_TTL = int(os.getenv("QUERY_EMBED_CACHE_TTL", 24 * 3600))  # Seconds; 0 disables
+METRICS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")  # Worker metric files; serve.py defaults to <tmp>/docusleuth-metrics-<port>
+
+# ========================================
+# Logging & Metrics
+# ========================================
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "query.log")  # Empty string = stderr only
 
 # ========================================
 # Memory Optimization
@@ -89,6 +166,29 @@ API_LIMITS = {
     }
 }
 
+# Client-side enforcement of the limits above (see ratelimit.py).
+# Override the limits through the environment on paid tiers.
+PROVIDER_QUOTAS = {
+    "cohere": {
+        "limits": {
+            "day": int(os.getenv("COHERE_CALLS_PER_DAY", API_LIMITS["cohere_rerank"]["calls_per_day"])),
+            "month": int(os.getenv("COHERE_CALLS_PER_MONTH", API_LIMITS["cohere_rerank"]["calls_per_month"])),
+        },
+        "queue_timeout": float(os.getenv("COHERE_QUEUE_TIMEOUT", 2.0)),  # Seconds; rerank is optional
+    },
+    "gemini": {
+        "limits": {
+            "minute": int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", API_LIMITS["gemini"]["requests_per_minute"])),
+            "day": int(os.getenv("GEMINI_REQUESTS_PER_DAY", API_LIMITS["gemini"]["requests_per_day"])),
+        },
+        "queue_timeout": float(os.getenv("GEMINI_QUEUE_TIMEOUT", 20.0)),
+    },
+}
+QUOTA_DB_PATH = os.getenv("QUOTA_DB_PATH", "quota.db")  # Token buckets shared by all workers on the host
+RATE_LIMIT_MAX_RETRIES = 3  # Retries after a 429
+RATE_LIMIT_BACKOFF_BASE = 0.5  # Seconds, doubled per attempt (full jitter)
+RATE_LIMIT_BACKOFF_CAP = 8.0
+
 def get_api_limits_info():
     """Print API usage limits"""
     print("\n📊 API Free Tier Limits:")
@@ -0,0 +1,172 @@
+# context_builder.py - Token-budgeted context assembly for answer generation
+#
+# Reranked chunks often come from the same page and overlap by CHUNK_OVERLAP
+# characters. Instead of concatenating them verbatim, chunks of one page are
+# merged on their char offsets, spans already contained in another are dropped,
+# and the result is packed into a token budget in relevance order.
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate: the larger of ~4 chars/token and the word/punctuation
+    count, which keeps non-Latin scripts and numeric tables from being undercounted.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), len(TOKEN_PATTERN.findall(text)))
+
+
+@dataclass
+class ContextSpan:
+    page: object
+    source: str
+    text: str
+    start: Optional[int]
+    end: Optional[int]
+    rank: int              # best (lowest) rerank position among merged chunks
+    has_table: bool
+    chunk_type: str
+    merged: int = 1        # number of chunks folded into this span
+
+
+def overlap_length(left: str, right: str, expected: int = 0) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    if 0 < expected <= min(len(left), len(right)) and left.endswith(right[:expected]):
+        return expected
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _to_span(rank: int, doc: Document) -> ContextSpan:
+    meta = doc.metadata or {}
+    return ContextSpan(
+        page=meta.get("page", "Unknown"),
+        source=meta.get("source", ""),
+        text=doc.page_content,
+        start=meta.get("char_start"),
+        end=meta.get("char_end"),
+        rank=rank,
+        has_table=bool(meta.get("has_table", False)),
+        chunk_type=meta.get("chunk_type", "unknown"),
+    )
+
+
+def _merge_page(spans: List[ContextSpan], max_gap: int) -> List[ContextSpan]:
+    """Merge contiguous/overlapping spans of a single page"""
+    located = sorted((s for s in spans if s.start is not None), key=lambda s: s.start)
+    merged: List[ContextSpan] = []
+    for span in located:
+        last = merged[-1] if merged else None
+        if last is None or span.start > last.end + max_gap:
+            merged.append(span)
+            continue
+        if span.end <= last.end:
+            # Fully inside the previous span
+            last.rank = min(last.rank, span.rank)
+            last.merged += 1
+            continue
+        cut = overlap_length(last.text, span.text, expected=last.end - span.start)
+        separator = "" if cut or span.start == last.end else "\n"
+        last.text = last.text + separator + span.text[cut:]
+        last.end = span.end
+        last.rank = min(last.rank, span.rank)
+        last.has_table = last.has_table or span.has_table
+        last.chunk_type = "mixed" if last.chunk_type != span.chunk_type else last.chunk_type
+        last.merged += 1
+    return merged + [s for s in spans if s.start is None]
+
+
+def _drop_contained(spans: List[ContextSpan]) -> Tuple[List[ContextSpan], int]:
+    """Drop spans whose text already appears inside a longer kept span"""
+    kept: List[ContextSpan] = []
+    dropped = 0
+    for span in sorted(spans, key=lambda s: len(s.text), reverse=True):
+        needle = span.text.strip()
+        holder = next((k for k in kept if needle in k.text), None)
+        if holder is not None:
+            holder.rank = min(holder.rank, span.rank)
+            dropped += 1
+        else:
+            kept.append(span)
+    return kept, dropped
+
+
+def merge_chunks(docs: List[Document], max_gap: int = 0) -> Tuple[List[ContextSpan], int]:
+    """
+    Merge chunks per page and drop redundant ones.
+    Returns (spans ordered by best rank, number of dropped spans).
+    """
+    by_page: Dict[tuple, List[ContextSpan]] = {}
+    for rank, doc in enumerate(docs):
+        span = _to_span(rank, doc)
+        by_page.setdefault((span.source, span.page), []).append(span)
+    merged = [m for page_spans in by_page.values() for m in _merge_page(page_spans, max_gap)]
+    merged, dropped = _drop_contained(merged)
+    merged.sort(key=lambda s: s.rank)
+    return merged, dropped
+
+
+def _format_span(index: int, span: ContextSpan) -> str:
+    header = f"[Document {index} - Page {span.page}"
+    if span.has_table:
+        header += " - CONTAINS TABLE DATA"
+    header += "]"
+    content = span.text
+    if span.has_table and span.chunk_type == "table_only":
+        content = f"TABLE START\n{content}\nTABLE END"
+    return f"{header}\n{content}\n"
+
+
+def build_context(docs: List[Document], token_budget: int, max_gap: int = 0) -> Tuple[str, Dict]:
+    """
+    Assemble the generation context from reranked docs (most relevant first).
+    Returns (context, stats) where stats reports tokens before/after and what was merged.
+    """
+    raw_tokens = sum(
+        estimate_tokens(_format_span(i, _to_span(i, doc))) for i, doc in enumerate(docs, 1)
+    )
+    merged, dropped = merge_chunks(docs, max_gap)
+
+    blocks = []
+    used = 0
+    truncated = 0
+    for span in merged:
+        block = _format_span(len(blocks) + 1, span)
+        cost = estimate_tokens(block)
+        if used + cost > token_budget:
+            remaining = token_budget - used
+            if blocks or remaining <= 0:
+                truncated += 1
+                continue
+            # Always keep (part of) the most relevant span
+            span.text = span.text[: remaining * CHARS_PER_TOKEN]
+            block = _format_span(1, span)
+            cost = estimate_tokens(block)
+            truncated += 1
+        blocks.append(block)
+        used += cost
+
+    context = "\n\n".join(blocks)
+    stats = {
+        "chunks_in": len(docs),
+        "spans_out": len(blocks),
+        "chunks_merged": sum(s.merged - 1 for s in merged),
+        "spans_dropped": dropped,
+        "spans_over_budget": truncated,
+        "raw_tokens": raw_tokens,
+        "context_tokens": estimate_tokens(context),
+    }
+    stats["tokens_saved"] = max(0, raw_tokens - stats["context_tokens"])
+    return context, stats
@@ -2,16 +2,72 @@ from langchain_ollama import OllamaEmbeddings
 from qdrant_client import QdrantClient
 
 from config import (
-    OLLAMA_BASE_URL, 
-    OLLAMA_EMBEDDING_MODEL,
+    EMBEDDING_MODEL,
+    OLLAMA_BASE_URL,
 )
 
+# Embedding model registry: backend and vector size of every supported model.
+# The size is known without calling the model; collections created with one
+# model cannot be queried with a model of another size.
+EMBEDDING_MODELS = {
+    # Ollama over HTTP (default)
+    "nomic-embed-text:latest": {"backend": "ollama", "dim": 768},
+    # In-process ONNX on the CPU, int8-quantized weights
+    "nomic-embed-text-v1.5-int8": {
+        "backend": "onnx",
+        "dim": 768,
+        "repo": "nomic-ai/nomic-embed-text-v1.5",
+        "model_file": "onnx/model_quantized.onnx",
+        "pooling": "mean",
+        "query_prefix": "search_query: ",
+        "document_prefix": "search_document: ",
+    },
+    "bge-small-en-v1.5-int8": {
+        "backend": "onnx",
+        "dim": 384,
+        "repo": "Xenova/bge-small-en-v1.5",
+        "model_file": "onnx/model_quantized.onnx",
+        "pooling": "cls",
+        "query_prefix": "Represent this sentence for searching relevant passages: ",
+    },
+    # Gemini embedding API
+    "text-embedding-004": {"backend": "gemini", "dim": 768},
+}
+
+def create_embedder(name: str):
+    """Build the LangChain embeddings object for a registered model"""
+    if name not in EMBEDDING_MODELS:
+        raise ValueError(f"Unknown embedding model '{name}'. Known models: {', '.join(EMBEDDING_MODELS)}")
+    spec = EMBEDDING_MODELS[name]
+
+    if spec["backend"] == "ollama":
+        return OllamaEmbeddings(
+            model=name,
+            base_url=OLLAMA_BASE_URL,
+            keep_alive=False  # Unload when not in use to save memory
+        )
+    if spec["backend"] == "onnx":
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            repo=spec["repo"],
+            model_file=spec["model_file"],
+            dim=spec["dim"],
+            pooling=spec.get("pooling", "mean"),
+            query_prefix=spec.get("query_prefix", ""),
+            document_prefix=spec.get("document_prefix", ""),
+        )
+    if spec["backend"] == "gemini":
+        from gemini_embeddings import GeminiEmbeddings
+        return GeminiEmbeddings()
+    raise ValueError(f"Unknown embedding backend '{spec['backend']}'")
+
 # Embedding Model
-embedding_model = OllamaEmbeddings(
-    model=OLLAMA_EMBEDDING_MODEL,
-    base_url=OLLAMA_BASE_URL,
-    keep_alive=False  # Unload when not in use to save memory
-)
+embedding_model = create_embedder(EMBEDDING_MODEL)
+embedding_dim = EMBEDDING_MODELS[EMBEDDING_MODEL]["dim"]
+
+def embedding_dimension() -> int:
+    """Vector size of the configured embedding model"""
+    return embedding_dim
 
 # Qdrant Client
 qdrant_client = QdrantClient(
@@ -0,0 +1,125 @@
+# jobs.py - Registry of ingestion jobs (one per uploaded file), shared by every worker
+#
+# Jobs live in a WAL-mode SQLite file, so GET /api/jobs/{id} answers from any
+# worker process, not just the one that accepted the upload. A job is only
+# ever written by the process running its ingestion (its owner), which is
+# also the only one that drains it on shutdown.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter
+
+from config import JOB_DB_PATH, JOB_RETENTION_SECONDS
+
+router = APIRouter()
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+_lock = threading.Lock()
+_conn = sqlite3.connect(JOB_DB_PATH, check_same_thread=False, timeout=5.0)
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.execute("PRAGMA synchronous=NORMAL")
+_conn.executescript("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        batch_id TEXT,
+        status TEXT NOT NULL,
+        owner INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        job TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id);
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, owner);
+""")
+_conn.commit()
+
+
+def _prune(now: float):
+    """Forget finished jobs older than JOB_RETENTION_SECONDS"""
+    _conn.execute(
+        f"DELETE FROM jobs WHERE status NOT IN ({','.join('?' * len(ACTIVE_STATUSES))}) AND updated_at < ?",
+        (*ACTIVE_STATUSES, now - JOB_RETENTION_SECONDS),
+    )
+
+
+def _save(job: dict):
+    _conn.execute(
+        "INSERT OR REPLACE INTO jobs (job_id, batch_id, status, owner, updated_at, job) VALUES (?, ?, ?, ?, ?, ?)",
+        (job["job_id"], job["batch_id"], job["status"], os.getpid(), job["updated_at"], json.dumps(job)),
+    )
+
+
+def create_job(filename: str, collection: Optional[str], batch_id: Optional[str] = None,
+               status: str = "queued", **fields) -> dict:
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "batch_id": batch_id,
+        "filename": filename,
+        "collection": collection,
+        "status": status,
+        "created_at": now,
+        "updated_at": now,
+        **fields,
+    }
+    with _lock:
+        _prune(now)
+        _save(job)
+        _conn.commit()
+    return job
+
+
+def update_job(job_id: str, **fields):
+    # Only the owning process writes a job, so read-modify-write is safe here
+    with _lock:
+        row = _conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is not None:
+            job = json.loads(row[0])
+            job.update(fields, updated_at=time.time())
+            _save(job)
+            _conn.commit()
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with _lock:
+        row = _conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def batch_jobs(batch_id: str) -> List[dict]:
+    with _lock:
+        rows = _conn.execute("SELECT job FROM jobs WHERE batch_id = ? ORDER BY rowid", (batch_id,)).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def active_jobs() -> List[dict]:
+    """Queued or running jobs of this process"""
+    with _lock:
+        rows = _conn.execute(
+            f"SELECT job FROM jobs WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))}) AND owner = ?",
+            (*ACTIVE_STATUSES, os.getpid()),
+        ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown job '{job_id}'"}
+    return job
+
+
+@router.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    jobs = batch_jobs(batch_id)
+    counts: Dict[str, int] = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return {"batch_id": batch_id, "counts": counts, "jobs": jobs}
@@ -1,14 +1,78 @@
 # Main FastAPI App
 
+import asyncio
+import contextlib
+import time
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
+from config import SHUTDOWN_DRAIN_SECONDS, WARMUP_ON_START
+import embeddings
 
+from telemetry import configure_logging, request_context_middleware
+from telemetry import router as metrics_router
 from uploadv1 import router as upload_router
+from jobs import active_jobs, update_job
+from jobs import router as jobs_router
 from query import router as query_router
+from summarize import router as summarize_router
+from ocr import shutdown_pool as shutdown_ocr_pool
+from pdf_parse import shutdown_pool as shutdown_parse_pool
+from registry import gc_loop
+from registry import router as admin_router
+from telemetry import get_logger
+
+configure_logging()
+logger = get_logger("server")
+
+
+async def warm_up():
+    """Load the embedding model now instead of on the first request"""
+    try:
+        await run_in_threadpool(embeddings.embedding_model.embed_query, "warm up")
+    except Exception as e:
+        logger.warning("embedding warm-up failed", extra={"error": str(e)})
+
+
+async def drain_ingestion():
+    """
+    Wait up to SHUTDOWN_DRAIN_SECONDS for this worker's running ingestion
+    jobs; whatever is still running afterwards is marked failed.
+    """
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_SECONDS
+    jobs = active_jobs()
+    if jobs:
+        logger.info("draining ingestion before shutdown", extra={"jobs": len(jobs)})
+    while jobs and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        jobs = active_jobs()
+    for job in jobs:
+        update_job(job["job_id"], status="failed", error="Interrupted by server shutdown")
+        logger.error("ingestion interrupted by shutdown", extra={"file": job["filename"], "collection": job["collection"]})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_START:
+        await warm_up()
+    # Background GC of idle collections
+    gc_task = asyncio.create_task(gc_loop())
+    yield
+    gc_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await gc_task
+    await drain_ingestion()
+    # Jobs are done with parsing and OCR now; stop their worker processes
+    await run_in_threadpool(shutdown_parse_pool)
+    await run_in_threadpool(shutdown_ocr_pool)
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+app.middleware("http")(request_context_middleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,7 +82,11 @@ app.add_middleware(
 )
 
 app.include_router(upload_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
 app.include_router(query_router, prefix="/api")
+app.include_router(summarize_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+app.include_router(metrics_router)
 
 
 @app.get("/")
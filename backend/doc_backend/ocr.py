@@ -0,0 +1,201 @@
+# ocr.py - OCR engine for scanned pages
+#
+# Pages (not the images embedded in them) are rendered in grayscale at
+# OCR_DPI, so oversized scans are downsampled and every page reaches the
+# recognizer at the resolution it was tuned for. Pages are grouped into
+# batches of OCR_BATCH_SIZE and recognized with EasyOCR's batched API on a
+# spawn-based process pool of OCR_WORKERS processes (each keeps readers for
+# its OCR_MAX_READERS most recently used language sets). OCR_WORKERS=0 runs
+# recognition inline.
+
+import multiprocessing
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pymupdf as fitz
+
+from config import (
+    OCR_BATCH_SIZE,
+    OCR_DPI,
+    OCR_GPU,
+    OCR_LANGUAGES,
+    OCR_MAX_READERS,
+    OCR_WORKERS,
+    WORKER_CPUS,
+)
+from telemetry import get_logger
+
+logger = get_logger("ocr")
+
+# EasyOCR 1.7 recognition models. Latin languages combine freely; every
+# other code selects a script model that reads only its own languages plus
+# English. Scripts are listed in the order easyocr.Reader picks them.
+LATIN_LANGUAGES = {
+    "af", "az", "bs", "cs", "cy", "da", "de", "en", "es", "et", "fr", "ga", "hr", "hu",
+    "id", "is", "it", "ku", "la", "lt", "lv", "mi", "ms", "mt", "nl", "no", "oc", "pi",
+    "pl", "pt", "ro", "rs_latin", "sk", "sl", "sq", "sv", "sw", "tl", "tr", "uz", "vi",
+}
+SCRIPT_LANGUAGES = [
+    ("Thai", {"th"}),
+    ("Traditional Chinese", {"ch_tra"}),
+    ("Simplified Chinese", {"ch_sim"}),
+    ("Japanese", {"ja"}),
+    ("Korean", {"ko"}),
+    ("Tamil", {"ta"}),
+    ("Telugu", {"te"}),
+    ("Kannada", {"kn"}),
+    ("Bengali", {"bn", "as", "mni"}),
+    ("Arabic", {"ar", "fa", "ug", "ur"}),
+    ("Devanagari", {"hi", "mr", "ne", "bh", "mai", "ang", "bho", "mah", "sck", "new", "gom", "sa", "bgc"}),
+    ("Cyrillic", {"ru", "rs_cyrillic", "be", "bg", "uk", "mn", "abq", "ady", "kbd",
+                  "ava", "dar", "inh", "che", "lbe", "lez", "tab", "tjk"}),
+]
+SUPPORTED_LANGUAGES = LATIN_LANGUAGES.union(*(codes for _, codes in SCRIPT_LANGUAGES))
+
+
+def language_error(languages: Sequence[str]) -> Optional[str]:
+    """Why EasyOCR would refuse this language set; None if it can be read"""
+    unknown = [code for code in languages if code not in SUPPORTED_LANGUAGES]
+    if unknown:
+        return f"Unsupported OCR language(s): {', '.join(unknown)}"
+    for script, codes in SCRIPT_LANGUAGES:
+        if codes & set(languages):
+            others = [code for code in languages if code not in codes and code != "en"]
+            if others:
+                return f"{script} OCR can only be combined with English, not {', '.join(others)}"
+            return None
+    return None
+
+
+def create_reader(languages: tuple):
+    from easyocr import Reader
+    return Reader(list(languages), gpu=OCR_GPU, verbose=False)
+
+# Builds the recognizer for a language set (bench/stubs.py swaps it out)
+reader_factory = create_reader
+
+# Per process: readers of the most recently used language sets
+_readers: "OrderedDict[tuple, object]" = OrderedDict()
+
+
+def get_reader(languages: tuple):
+    if languages in _readers:
+        _readers.move_to_end(languages)
+        return _readers[languages]
+    # Each reader holds its detector and recognizer models in memory
+    while len(_readers) >= max(1, OCR_MAX_READERS):
+        _readers.popitem(last=False)
+    _readers[languages] = reader_factory(languages)
+    return _readers[languages]
+
+
+def render_page(pdf_doc, page_index: int, dpi: int = OCR_DPI) -> np.ndarray:
+    """Grayscale image of one page at `dpi`"""
+    pix = pdf_doc[page_index].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return np.ascontiguousarray(samples[:, :pix.width])
+
+
+def recognize(images: List[np.ndarray], languages: tuple) -> List[str]:
+    """
+    Text of each image. Images of the same size (pages of one format at one
+    DPI) go through the detector and recognizer together.
+    """
+    reader = get_reader(languages)
+    texts = [""] * len(images)
+    by_shape: Dict[tuple, List[int]] = {}
+    for index, image in enumerate(images):
+        by_shape.setdefault(image.shape, []).append(index)
+
+    for (height, width), indexes in by_shape.items():
+        if len(indexes) > 1:
+            results = reader.readtext_batched(
+                [images[i] for i in indexes], n_height=height, n_width=width,
+                batch_size=OCR_BATCH_SIZE, detail=0,
+            )
+        else:
+            results = [reader.readtext(images[indexes[0]], batch_size=OCR_BATCH_SIZE, detail=0)]
+        for index, lines in zip(indexes, results):
+            texts[index] = " ".join(lines).strip()
+    return texts
+
+
+def _init_worker(threads: int):
+    # Split the cores between pool processes instead of each using all of them
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            threads = max(1, WORKER_CPUS // OCR_WORKERS)
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                # fork is unsafe in a process already running threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads,),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def recognize_pages(pdf_doc, page_indexes: Sequence[int], languages: Optional[Sequence[str]] = None) -> Dict[int, str]:
+    """
+    OCR the given 0-based pages; returns {page_index: text}. Rendering stays
+    on the calling thread (documents cannot be shared between processes) and
+    at most two batches per pool process are in flight, which bounds memory.
+    A failed batch yields empty text for its pages.
+    """
+    languages = tuple(languages or OCR_LANGUAGES)
+    page_indexes = list(page_indexes)
+    batches = [page_indexes[i:i + OCR_BATCH_SIZE] for i in range(0, len(page_indexes), OCR_BATCH_SIZE)]
+    texts: Dict[int, str] = {}
+
+    def collect(batch, run):
+        try:
+            batch_texts = run()
+        except BrokenProcessPool as e:
+            logger.error("OCR worker died, restarting pool", extra={"error": str(e)})
+            shutdown_pool()
+            batch_texts = [""] * len(batch)
+        except Exception as e:
+            logger.warning("OCR failed for a batch", extra={"pages": [p + 1 for p in batch], "error": str(e)})
+            batch_texts = [""] * len(batch)
+        texts.update(zip(batch, batch_texts))
+
+    if OCR_WORKERS <= 0:
+        for batch in batches:
+            images = [render_page(pdf_doc, p) for p in batch]
+            collect(batch, lambda: recognize(images, languages))
+        return texts
+
+    pending = deque()
+    for batch in batches:
+        images = [render_page(pdf_doc, p) for p in batch]
+        pending.append((batch, get_pool().submit(recognize, images, languages).result))
+        if len(pending) >= 2 * OCR_WORKERS:
+            collect(*pending.popleft())
+    while pending:
+        collect(*pending.popleft())
+    return texts
@@ -0,0 +1,74 @@
+# onnx_embeddings.py - In-process CPU embeddings with a (quantized) ONNX transformer
+#
+# Model and tokenizer are fetched once from the Hugging Face Hub into the
+# local cache. Texts are tokenized in batches, padded to the longest text of
+# the batch (texts are length-sorted first to keep padding small) and run on
+# onnxruntime's CPU provider, which spreads each batch over ONNX_THREADS cores.
+
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import ONNX_BATCH_SIZE, ONNX_MAX_LENGTH, ONNX_THREADS
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings backed by an onnxruntime session"""
+
+    def __init__(self, repo: str, model_file: str, dim: int, pooling: str = "mean",
+                 query_prefix: str = "", document_prefix: str = ""):
+        # Optional dependencies: only needed when an ONNX model is configured
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.dim = dim
+        self.pooling = pooling
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo, "tokenizer.json"))
+        self.tokenizer.enable_truncation(ONNX_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            hf_hub_download(repo, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        hidden = self.session.run(None, feeds)[0]  # (batch, tokens, dim)
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(hidden.dtype)
+            vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Model returned {vectors.shape[1]}-dim vectors, registry says {self.dim}")
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Length-sorted batches pad less; results are put back in input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), ONNX_BATCH_SIZE):
+            batch = order[start:start + ONNX_BATCH_SIZE]
+            encoded = self._encode([self.document_prefix + texts[i] for i in batch])
+            for index, vector in zip(batch, encoded):
+                vectors[index] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([self.query_prefix + text])[0].tolist()
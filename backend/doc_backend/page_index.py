@@ -0,0 +1,135 @@
+# page_index.py - Page-level vectors for coarse-to-fine retrieval on large documents
+#
+# For documents with at least PAGE_INDEX_MIN_PAGES pages, ingestion also
+# writes one vector per page (the mean of that page's chunk vectors, so no
+# extra embedding calls) to a sibling collection "<collection>__pages".
+# A query first finds the best PAGE_CANDIDATES pages there, then runs the
+# chunk search restricted to those pages.
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client.models import (
+    Distance,
+    FieldCondition,
+    Filter,
+    MatchAny,
+    PayloadSchemaType,
+    PointStruct,
+    VectorParams,
+)
+
+from config import PAGE_INDEX_RECHECK_SECONDS, PAGE_INDEX_SUFFIX
+from embeddings import qdrant_client
+from registry import on_evict
+from telemetry import get_logger
+
+logger = get_logger("pages")
+
+# collection -> (whether a page index exists, when that was checked).
+# An existing index is remembered until eviction; a missing one only for
+# PAGE_INDEX_RECHECK_SECONDS, since queries can arrive while ingestion is
+# still running and the page index is written after the chunks.
+PAGE_INDEX_CACHE: Dict[str, Tuple[bool, float]] = {}
+
+
+def page_collection(collection: str) -> str:
+    return f"{collection}{PAGE_INDEX_SUFFIX}"
+
+
+class PageVectorSums:
+    """Running per-page sums of chunk vectors for one document"""
+
+    def __init__(self):
+        self.sums: Dict[int, np.ndarray] = {}
+        self.counts: Dict[int, int] = {}
+
+    def add(self, page: int, vector: List[float]):
+        vector = np.asarray(vector, dtype=np.float32)
+        if page in self.sums:
+            self.sums[page] += vector
+            self.counts[page] += 1
+        else:
+            self.sums[page] = vector.copy()
+            self.counts[page] = 1
+
+    def merge(self, other: "PageVectorSums"):
+        for page, vector in other.sums.items():
+            if page in self.sums:
+                self.sums[page] += vector
+                self.counts[page] += other.counts[page]
+            else:
+                self.sums[page] = vector
+                self.counts[page] = other.counts[page]
+
+    def means(self) -> Dict[int, np.ndarray]:
+        return {page: vector / self.counts[page] for page, vector in self.sums.items()}
+
+
+def build_page_index(collection: str, page_sums: PageVectorSums) -> int:
+    """(Re)create the page collection from accumulated chunk vectors; returns pages indexed"""
+    means = page_sums.means()
+    if not means:
+        return 0
+    name = page_collection(collection)
+    if qdrant_client.collection_exists(name):
+        qdrant_client.delete_collection(name)
+    size = len(next(iter(means.values())))
+    qdrant_client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=size, distance=Distance.COSINE),
+    )
+    points = [
+        PointStruct(id=page, vector=vector.tolist(), payload={"page": page, "chunks": page_sums.counts[page]})
+        for page, vector in sorted(means.items())
+    ]
+    for start in range(0, len(points), 256):
+        qdrant_client.upsert(name, points=points[start:start + 256])
+    PAGE_INDEX_CACHE[collection] = (True, time.monotonic())
+    return len(points)
+
+
+def index_chunk_pages(collection: str):
+    """Index metadata.page on the chunk collection so page-filtered search stays cheap"""
+    qdrant_client.create_payload_index(
+        collection_name=collection,
+        field_name="metadata.page",
+        field_schema=PayloadSchemaType.INTEGER,
+    )
+
+
+def has_page_index(collection: str) -> bool:
+    now = time.monotonic()
+    cached = PAGE_INDEX_CACHE.get(collection)
+    if cached and (cached[0] or now - cached[1] < PAGE_INDEX_RECHECK_SECONDS):
+        return cached[0]
+    exists = qdrant_client.collection_exists(page_collection(collection))
+    PAGE_INDEX_CACHE[collection] = (exists, now)
+    return exists
+
+
+def search_pages(collection: str, query_vector: List[float], limit: int) -> List[int]:
+    """Page numbers of the `limit` pages closest to the query"""
+    response = qdrant_client.query_points(
+        collection_name=page_collection(collection),
+        query=query_vector,
+        limit=limit,
+        with_payload=False,
+    )
+    return [int(point.id) for point in response.points]
+
+
+def page_filter(pages: List[int]) -> Optional[Filter]:
+    if not pages:
+        return None
+    return Filter(must=[FieldCondition(key="metadata.page", match=MatchAny(any=pages))])
+
+
+def delete_page_index(collection: str):
+    PAGE_INDEX_CACHE.pop(collection, None)
+    name = page_collection(collection)
+    if qdrant_client.collection_exists(name):
+        qdrant_client.delete_collection(name)
+
+on_evict(delete_page_index)
@@ -0,0 +1,190 @@
+# pdf_parse.py - PDF to markdown and table-preserving chunks, in a pool of parse processes
+#
+# Markdown extraction (pymupdf4llm) is pure Python and holds the GIL, so
+# documents are parsed in PARSE_WORKERS spawn-started processes instead of
+# one after another on the ingestion thread. This module is what those
+# processes import: it depends on nothing but the parser and splitter.
+# Pages with too little text are returned unchunked for OCR, which runs in
+# the parent (it needs the OCR pool and the upload's languages).
+
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import pymupdf as fitz
+import pymupdf4llm
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from config import PARSE_WORKERS
+
+# --- Configuration ---
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+MIN_TEXT_FOR_OCR = 50  # If page has less text, try OCR
+
+# --- Helper Functions ---
+
+def detect_tables_in_text(text: str) -> bool:
+    """Check if text contains markdown tables"""
+    # Look for markdown table patterns
+    lines = text.split('\n')
+    table_row_count = sum(1 for line in lines if '|' in line and line.strip().startswith('|'))
+    return table_row_count >= 2  # At least header + one data row
+
+def extract_tables_from_text(text: str) -> List[str]:
+    """Extract complete markdown tables from text"""
+    tables = []
+    lines = text.split('\n')
+    current_table = []
+    in_table = False
+    
+    for line in lines:
+        if '|' in line and line.strip().startswith('|'):
+            in_table = True
+            current_table.append(line)
+        elif in_table:
+            if line.strip() == '' or not line.strip().startswith('|'):
+                # Table ended
+                if len(current_table) >= 2:  # Valid table
+                    tables.append('\n'.join(current_table))
+                current_table = []
+                in_table = False
+    
+    # Handle case where table is at the end
+    if current_table and len(current_table) >= 2:
+        tables.append('\n'.join(current_table))
+    
+    return tables
+
+def locate_chunk(page_text: str, chunk: str, search_from: int = 0):
+    """
+    Find (char_start, char_end) of a chunk in the page text.
+    Chunks that were rebuilt around table placeholders may not match verbatim,
+    so fall back to anchoring on their first line.
+    """
+    start = page_text.find(chunk, search_from)
+    if start == -1:
+        anchor = chunk.strip()[:64]
+        start = page_text.find(anchor, search_from) if anchor else -1
+        if start == -1 and anchor:
+            start = page_text.find(anchor)
+    if start == -1:
+        return None, None
+    return start, min(len(page_text), start + len(chunk))
+
+def smart_chunk_text(text: str, page_num: int, filename: str) -> List[Dict]:
+    """
+    Smart chunking that preserves tables intact and splits regular text
+    """
+    chunks = []
+    search_from = 0
+    
+    # First, extract any tables
+    tables = extract_tables_from_text(text)
+    
+    # Remove tables from text temporarily to chunk the rest
+    text_without_tables = text
+    for table_idx, table in enumerate(tables):
+        text_without_tables = text_without_tables.replace(table, f"\n[TABLE_PLACEHOLDER_{table_idx}]\n")
+    
+    # Chunk the non-table text
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    text_chunks = splitter.split_text(text_without_tables)
+    
+    # Process each text chunk
+    for chunk in text_chunks:
+        # Check if this chunk contains table placeholders
+        table_placeholders = re.findall(r'\[TABLE_PLACEHOLDER_(\d+)\]', chunk)
+        
+        if table_placeholders:
+            # Replace placeholders with actual tables
+            for placeholder_idx in table_placeholders:
+                idx = int(placeholder_idx)
+                if idx < len(tables):
+                    chunk = chunk.replace(f"[TABLE_PLACEHOLDER_{idx}]", tables[idx])
+        
+        if chunk.strip():
+            char_start, char_end = locate_chunk(text, chunk, search_from)
+            if char_start is not None:
+                search_from = char_start + 1
+            chunks.append({
+                "text": chunk,
+                "metadata": {
+                    "page": page_num,
+                    "source": filename,
+                    "has_table": detect_tables_in_text(chunk),
+                    "chunk_type": "mixed" if detect_tables_in_text(chunk) else "text",
+                    "char_start": char_start,
+                    "char_end": char_end
+                }
+            })
+    
+    # Add standalone tables that weren't included in text chunks
+    for i, table in enumerate(tables):
+        # Check if this table was already included in a chunk
+        table_included = any(table in chunk["text"] for chunk in chunks)
+        if not table_included:
+            char_start, char_end = locate_chunk(text, table)
+            chunks.append({
+                "text": table,
+                "metadata": {
+                    "page": page_num,
+                    "source": filename,
+                    "has_table": True,
+                    "chunk_type": "table_only",
+                    "char_start": char_start,
+                    "char_end": char_end
+                }
+            })
+    
+    return chunks
+
+# --- Parsing (runs in the parse processes) ---
+
+def parse_pdf(data: bytes, filename: str) -> dict:
+    """
+    Extract and chunk one PDF. Returns {"pages": page_count,
+    "chunks": {page: [chunk, ...]}, "scanned": {page: text}}, where
+    scanned pages are the ones left for OCR.
+    """
+    with fitz.open(stream=data, filetype="pdf") as pdf_doc:
+        md_pages = pymupdf4llm.to_markdown(pdf_doc, page_chunks=True)
+    
+    chunks, scanned = {}, {}
+    for page_data in md_pages:
+        page_text = page_data["text"]
+        page_num = page_data["metadata"]["page"]
+        if len(page_text.strip()) < MIN_TEXT_FOR_OCR:
+            scanned[page_num] = page_text
+        else:
+            chunks[page_num] = smart_chunk_text(page_text, page_num, filename)
+    return {"pages": len(md_pages), "chunks": chunks, "scanned": scanned}
+
+# --- Parse Pool ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                # fork is unsafe in a process already running threads
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
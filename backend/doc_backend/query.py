@@ -1,21 +1,64 @@
+import json
 import time
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
 import cohere
 from google import genai
 from google.genai import types
-import logging
 
 from embeddings import embedding_model, qdrant_client
-from config import COHERE_API_KEY, GEMINI_API_KEY
+from config import (
+    ADAPTIVE_K_MAX_FACTOR,
+    ADAPTIVE_SCORE_WINDOW,
+    ANSWER_CACHE_TTL,
+    COHERE_API_KEY,
+    CONTEXT_MERGE_GAP,
+    CONTEXT_TOKEN_BUDGET,
+    DENSE_MIN_SCORE,
+    EMBEDDING_MODEL,
+    GEMINI_API_KEY,
+    PAGE_CANDIDATES,
+    QUERY_EMBED_CACHE_TTL,
+    RERANK_SKIP_MARGIN,
+    TABLE_FAST_PATH,
+)
+from context_builder import build_context
+from page_index import has_page_index, page_filter, search_pages
+from ratelimit import QuotaExhausted, scheduler
+from registry import is_ingesting, on_evict, touch_collection
+from shared_cache import SharedCache
+from singleflight import SingleFlight
+from table_store import is_lookup_question, lookup as lookup_table
+from telemetry import (
+    CANDIDATES_RETRIEVED,
+    CONTEXT_TOKENS,
+    CONTEXT_TOKENS_SAVED,
+    DOCS_AFTER_THRESHOLD,
+    LLM_TOKENS,
+    QUERY_COALESCED,
+    QUERY_DURATION,
+    QUERY_REQUESTS,
+    RERANK_DECISIONS,
+    RERANK_FALLBACKS,
+    RERANK_SECONDS_SAVED,
+    TABLE_LOOKUPS,
+    TOKENS_GENERATED,
+    get_logger,
+    request_id_var,
+    span,
+    span_seconds,
+    start_trace,
+    trace_attr,
+)
 
 router = APIRouter()
 
-logging.basicConfig(filename='query.log', level=logging.INFO , datefmt='%Y-%m-%d %H-%M-%S' , force=True)
+logger = get_logger("query")
 
 
 class QueryRequest(BaseModel):
@@ -93,11 +136,40 @@ def boost_table_docs(docs: List[Document], is_table_query: bool) -> List[Documen
     # Prioritize table documents but keep some text for context
     return table_docs + text_docs
 
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "of", "in", "on", "for", "to",
+    "and", "or", "what", "which", "who", "how", "does", "do", "about", "with",
+    "this", "that", "it", "be", "by", "as", "at", "from", "me", "show", "tell",
+}
+
+def content_tokens(text: str) -> set:
+    return {t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS}
+
+def rerank_locally(query: str, docs: List[Document], top_k: int = 3, is_table_query: bool = False):
+    """
+    Lexical-overlap reranker used when the Cohere quota is exhausted.
+    Ties keep the dense retrieval order.
+    """
+    query_terms = content_tokens(query)
+    if not docs or not query_terms:
+        return docs[:top_k]
+    
+    scored = []
+    for position, doc in enumerate(docs):
+        overlap = len(query_terms & content_tokens(doc.page_content)) / len(query_terms)
+        if is_table_query and (doc.metadata or {}).get("has_table", False):
+            overlap += 0.1
+        scored.append((overlap, -position, doc))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    
+    matching = [doc for score, _, doc in scored if score > 0]
+    return (matching or docs)[:top_k]
+
 def rerank_with_cohere(query: str, docs: List[Document], top_k: int = 3, is_table_query: bool = False):
     """
     Rerank documents using Cohere's rerank API with dynamic threshold
     """
-    logging.info(f"Reranking {len(docs)} documents with cohere")
+    logger.info("reranking with cohere", extra={"candidates": len(docs)})
     
     if not docs:
         return []
@@ -106,15 +178,19 @@ def rerank_with_cohere(query: str, docs: List[Document], top_k: int = 3, is_tabl
         # Prepare documents for Cohere
         documents = [doc.page_content for doc in docs]
         
-        # Call Cohere rerank API
-        results = co.rerank(
+        # Call Cohere rerank API (queued against the shared quota)
+        started = time.perf_counter()
+        results = scheduler.call(
+            "cohere",
+            co.rerank,
             query=query,
             documents=documents,
             top_n=min(top_k * 2, len(documents)),  # Get more candidates
             model="rerank-multilingual-v3.0"
         )
+        # Only answered calls: the fallbacks below say nothing about what a skip saves
+        record_rerank_time(time.perf_counter() - started)
         
-        print("\n📊 Cohere Reranking Scores:")
         reranked_docs = []
         
         # Dynamic threshold based on query type
@@ -125,8 +201,15 @@ def rerank_with_cohere(query: str, docs: List[Document], top_k: int = 3, is_tabl
             metadata = original_doc.metadata or {}
             has_table = metadata.get("has_table", False)
             
-            table_indicator = "📊" if has_table else "📄"
-            print(f"  {idx}. {table_indicator} Score: {result.relevance_score:.4f} - Page {metadata.get('page', 'Unknown')}")
+            logger.debug(
+                "rerank score",
+                extra={
+                    "rank": idx,
+                    "score": round(result.relevance_score, 4),
+                    "page": metadata.get("page", "Unknown"),
+                    "has_table": has_table,
+                },
+            )
             
             # For table queries, be more lenient with table-containing docs
             if is_table_query and has_table:
@@ -140,62 +223,77 @@ def rerank_with_cohere(query: str, docs: List[Document], top_k: int = 3, is_tabl
         # Ensure we return at least some results if we have any decent matches
         if not reranked_docs and results.results:
             # Take top result even if below threshold
-            print(f"⚠️ No docs above threshold, taking top result anyway")
+            logger.info("no docs above threshold, taking top result anyway")
             top_result = results.results[0]
             reranked_docs.append(docs[top_result.index])
         
         if not reranked_docs:
-            print("⚠️ No relevant documents found")
+            logger.info("no relevant documents found")
             return []
         
         # Limit to top_k
         return reranked_docs[:top_k]
         
+    except QuotaExhausted as e:
+        logger.warning(
+            "cohere quota exhausted, using local reranker",
+            extra={"retry_after_s": round(e.retry_after, 1)},
+        )
+        RERANK_FALLBACKS.labels(reason="quota").inc()
+        trace_attr("rerank_mode", "local")
+        return rerank_locally(query, docs, top_k=top_k, is_table_query=is_table_query)
+        
     except Exception as e:
-        print(f"❌ Cohere reranking failed: {str(e)}")
-        print("   Falling back to original document order")
+        logger.warning(
+            "cohere reranking failed, falling back to original document order",
+            extra={"error": str(e)},
+        )
+        RERANK_FALLBACKS.labels(reason="error").inc()
+        trace_attr("rerank_mode", "dense")
         return docs[:top_k]
 
-def format_context_with_tables(docs: List[Document]) -> str:
+def adaptive_candidates(scored: List[Tuple[Document, float]], k_min: int, k_max: int) -> List[Tuple[Document, float]]:
     """
-    Format context highlighting when tables are present
+    Adaptive retrieval depth: keep the hits scoring within ADAPTIVE_SCORE_WINDOW
+    of the best one. A steep drop-off shrinks the candidate set towards k_min,
+    a flat score distribution grows it up to k_max.
     """
-    context_blocks = []
-    
-    for idx, doc in enumerate(docs, 1):
-        metadata = doc.metadata or {}
-        page = metadata.get("page", "Unknown")
-        has_table = metadata.get("has_table", False)
-        chunk_type = metadata.get("chunk_type", "unknown")
-        
-        header = f"[Document {idx} - Page {page}"
-        if has_table:
-            header += " - CONTAINS TABLE DATA"
-        header += "]"
-        
-        content = doc.page_content
-        
-        # Add visual separator for tables
-        if has_table and chunk_type == "table_only":
-            content = f"TABLE START\n{content}\nTABLE END"
-        
-        context_block = f"{header}\n{content}\n"
-        context_blocks.append(context_block)
-    
-    return "\n\n".join(context_blocks)
+    if not scored:
+        return []
+    floor = scored[0][1] - ADAPTIVE_SCORE_WINDOW
+    within = sum(1 for _, score in scored[:k_max] if score >= floor)
+    return scored[:max(k_min, within)]
 
-def generate_answer_with_gemini(question: str, context: str, is_table_query: bool) -> str:
+def rerank_is_decisive(scored: List[Tuple[Document, float]], top_k: int) -> bool:
     """
-    Generate answer using Google Gemini with table-aware prompting
+    True when reranking cannot change which documents reach the prompt: the
+    top_k dense hits all clear DENSE_MIN_SCORE (the relevance guard) and either
+    nothing else was retrieved or they lead the next hit by RERANK_SKIP_MARGIN.
     """
-    try:
-        # Add extra guidance for table queries
-        if is_table_query:
-            table_guidance = "\n\nNOTE: This query is asking about tabular/structured data. Pay special attention to any tables in the context (marked with | symbols or TABLE START/END markers). Extract and present the relevant data clearly."
-        else:
-            table_guidance = ""
-        
-        full_prompt = f"""{SYSTEM_PROMPT}{table_guidance}
+    if not scored or scored[min(top_k, len(scored)) - 1][1] < DENSE_MIN_SCORE:
+        return False
+    if len(scored) <= top_k:
+        return True
+    return scored[top_k - 1][1] - scored[top_k][1] >= RERANK_SKIP_MARGIN
+
+# Recent Cohere rerank latency (EWMA), used to estimate the time a skip saves
+_rerank_seconds = None
+
+def record_rerank_time(seconds: float):
+    global _rerank_seconds
+    _rerank_seconds = seconds if _rerank_seconds is None else 0.8 * _rerank_seconds + 0.2 * seconds
+
+def build_prompt(question: str, context: str, is_table_query: bool) -> str:
+    """
+    Build the table-aware prompt sent to Gemini
+    """
+    # Add extra guidance for table queries
+    if is_table_query:
+        table_guidance = "\n\nNOTE: This query is asking about tabular/structured data. Pay special attention to any tables in the context (marked with | symbols or TABLE START/END markers). Extract and present the relevant data clearly."
+    else:
+        table_guidance = ""
+    
+    return f"""{SYSTEM_PROMPT}{table_guidance}
 
 Question: {question}
 
@@ -204,23 +302,60 @@ Context from documents:
 
 Provide a clear and accurate answer based on the context above."""
 
-        print(f"\n✨ Generating answer with {GEMINI_MODEL}...")
-        if is_table_query:
-            print("   🔍 Table-aware mode activated")
-        
-        response = gemini_client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=full_prompt,
-            config=types.GenerateContentConfig(
-                temperature=0.1,
-                max_output_tokens=2048,
-            ),
+def generate_text(prompt: str, max_output_tokens: int = 2048, timeout: float = None, reserve: float = 0.0):
+    """
+    Single Gemini call under the shared rate limiter.
+    Returns (text, usage) where usage holds prompt/generated token counts.
+    Raises QuotaExhausted when no request slot frees up before `timeout`
+    (without dipping into the `reserve` share of the quota).
+    """
+    response = scheduler.call(
+        "gemini",
+        gemini_client.models.generate_content,
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            temperature=0.1,
+            max_output_tokens=max_output_tokens,
+        ),
+        timeout=timeout,
+        reserve=reserve,
+    )
+    
+    usage = getattr(response, "usage_metadata", None)
+    token_usage = {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "tokens_generated": getattr(usage, "candidates_token_count", None) or 0,
+    }
+    LLM_TOKENS.labels(kind="prompt").inc(token_usage["prompt_tokens"])
+    LLM_TOKENS.labels(kind="generated").inc(token_usage["tokens_generated"])
+    return response.text, token_usage
+
+def generate_answer_with_gemini(prompt: str, is_table_query: bool) -> str:
+    """
+    Generate answer using Google Gemini with table-aware prompting
+    """
+    try:
+        logger.info(
+            "generating answer",
+            extra={"model": GEMINI_MODEL, "table_mode": is_table_query},
         )
         
-        return response.text
+        answer, token_usage = generate_text(prompt)
+        TOKENS_GENERATED.observe(token_usage["tokens_generated"])
+        trace_attr("prompt_tokens", token_usage["prompt_tokens"])
+        trace_attr("tokens_generated", token_usage["tokens_generated"])
+        
+        return answer
+        
+    except QuotaExhausted as e:
+        logger.warning("gemini quota exhausted", extra={"retry_after_s": round(e.retry_after, 1)})
+        trace_attr("generation_error", str(e))
+        return f"The answer service is at its request limit right now. Please try again in about {max(1, round(e.retry_after))} seconds."
         
     except Exception as e:
-        print(f"❌ Gemini generation failed: {str(e)}")
+        logger.error("gemini generation failed", extra={"error": str(e)})
+        trace_attr("generation_error", str(e))
         return f"I encountered an error while generating the answer: {str(e)}"
 
 VECTOR_STORE_CACHE = {}
@@ -234,70 +369,187 @@ def get_vector_store(collection: str):
             client=qdrant_client
         )
     
-    logging.info(f"using vector store for collection: {collection}")
     return VECTOR_STORE_CACHE[collection]
 
-@router.post("/query")
-async def query_doc(body: QueryRequest):
+on_evict(lambda collection: VECTOR_STORE_CACHE.pop(collection, None))
+
+# Shared by all worker processes (see shared_cache.py)
+ANSWER_CACHE = SharedCache("answer", ANSWER_CACHE_TTL)
+QUERY_EMBED_CACHE = SharedCache("query_embedding", QUERY_EMBED_CACHE_TTL)
+
+def embed_question(question: str) -> List[float]:
+    """Query vector, reused across workers for repeated questions"""
+    key = (EMBEDDING_MODEL, question)
+    vector = QUERY_EMBED_CACHE.get(key)
+    if vector is None:
+        vector = embedding_model.embed_query(question)
+        QUERY_EMBED_CACHE.set(key, vector)
+    return vector
+
+def retrieve_candidates(collection: str, query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
     """
-    Enhanced query endpoint with table-aware retrieval and generation
+    Chunk-level vector search returning (document, cosine score), best first.
+    Documents with a page index are searched coarse-to-fine: the closest
+    PAGE_CANDIDATES pages first, then chunks on those pages only. Falls back
+    to the flat search if that finds nothing.
+    """
+    vector_store = get_vector_store(collection)
+    if PAGE_CANDIDATES and has_page_index(collection):
+        with span("page_search"):
+            pages = search_pages(collection, query_vector, PAGE_CANDIDATES)
+        trace_attr("candidate_pages", pages)
+        if pages:
+            scored = vector_store.similarity_search_with_score_by_vector(query_vector, k=k, filter=page_filter(pages))
+            if scored:
+                return scored
+    return vector_store.similarity_search_with_score_by_vector(query_vector, k=k)
+
+def finish_query(query_type: str, status: str, start: float, trace: dict):
+    """Record end-of-request metrics and emit one structured summary line"""
+    elapsed = time.perf_counter() - start
+    QUERY_REQUESTS.labels(query_type=query_type, status=status).inc()
+    QUERY_DURATION.labels(query_type=query_type).observe(elapsed)
+    logger.info(
+        "query completed",
+        extra={
+            "status": status,
+            "query_type": query_type,
+            "duration_s": round(elapsed, 4),
+            "spans": trace["spans"],
+            **trace["attrs"],
+        },
+    )
+
+def answer_from_tables(body: QueryRequest) -> Optional[dict]:
+    """
+    Fast path: answer direct cell/row/aggregate lookups from the table store.
+    Returns None when the question needs retrieval and the LLM.
     """
+    with span("table_lookup"):
+        result = lookup_table(body.collection, body.question, allow_row_answers=True)
+    lookup_time = span_seconds("table_lookup")
+    TABLE_LOOKUPS.labels(outcome="hit" if result else "miss").inc()
+    if not result:
+        return None
     
-    logging.info(f"Query: {body.question}")
+    table = result["table"]
+    page = table.page if table.page is not None else "Unknown"
+    trace_attr("table_lookup", result["kind"])
+    return {
+        "answer": result["answer"],
+        "locations": [{
+            "page": page,
+            "pageIndex": page - 1 if isinstance(page, int) else 0,
+            "label": str(page),
+            "snippet": table.markdown[:200] + "..." if len(table.markdown) > 200 else table.markdown,
+            "full_text": table.markdown,
+            "has_table": True,
+            "chunk_type": "table_only",
+            "char_start": None,
+            "char_end": None,
+            "highlightText": table.markdown
+        }],
+        "summary": f"Answered from the table on page {page}",
+        "retrieval_time": lookup_time,
+        "rerank_time": 0.0,
+        "generation_time": 0.0,
+        "total_time": lookup_time,
+        "model_used": "table_store",
+        "query_type": "table",
+        "documents_analyzed": 1,
+        "tables_found": 1,
+        "request_id": request_id_var.get()
+    }
+
+def run_query_pipeline(body: QueryRequest) -> dict:
+    """
+    Table-aware retrieval, reranking and generation for one question.
+    Blocking (embedding, Qdrant, Cohere and Gemini SDK calls are synchronous).
+    Returns the response payload; serialisation is left to the caller.
+    """
+    query_start = time.perf_counter()
+    trace = start_trace()
     
-    vector_store = get_vector_store(body.collection)
+    touch_collection(body.collection)
+    # Answers over a half-ingested document are served but never cached
+    cacheable = not is_ingesting(body.collection)
 
     # Detect if this is a table-related query
     table_query = is_table_query(body.question)
+    query_type = "table" if table_query else "text"
+
+    logger.info(
+        "query received",
+        extra={"collection": body.collection, "question": body.question, "query_type": query_type},
+    )
     
-    # Step 1: Initial retrieval with embeddings
-    print(f"\n🔍 Query: {body.question}")
-    if table_query:
-        print("   📊 Detected as table-related query")
-    
-    start_retrieval = time.time()
+    # Step 0: Direct table lookups never reach retrieval or the LLM
+    if TABLE_FAST_PATH and table_query and is_lookup_question(body.question):
+        fast_response = answer_from_tables(body)
+        if fast_response:
+            if cacheable:
+                ANSWER_CACHE.set(query_key(body), fast_response, tag=body.collection)
+            finish_query("table", "table_store", query_start, trace)
+            return fast_response
     
-    # Retrieve more candidates for table queries
+    # Step 1: Initial retrieval with embeddings
+    # Retrieve more candidates for table queries; the final depth is
+    # decided by the score distribution (adaptive k)
     k_value = 15 if table_query else 10
-    initial_docs = vector_store.similarity_search(body.question, k=k_value)
+    top_k = 4 if table_query else 3  # Get more context for table queries
+    with span("embed"):
+        query_vector = embed_question(body.question)
+    with span("search"):
+        retrieved = retrieve_candidates(body.collection, query_vector, k_value * ADAPTIVE_K_MAX_FACTOR)
+        scored_docs = adaptive_candidates(retrieved, k_min=top_k, k_max=k_value * ADAPTIVE_K_MAX_FACTOR)
+    initial_docs = [doc for doc, _ in scored_docs]
     
-    end_retrieval = time.time()
-    retrieval_time = round(end_retrieval - start_retrieval, 4)
+    retrieval_time = round(span_seconds("embed") + span_seconds("search"), 4)
 
-    print(f"⏱️  Initial Retrieval: {retrieval_time}s")
-    print(f"📄 Retrieved {len(initial_docs)} candidates")
+    CANDIDATES_RETRIEVED.observe(len(initial_docs))
+    trace_attr("candidates_retrieved", len(initial_docs))
+    if scored_docs:
+        trace_attr("top_score", round(scored_docs[0][1], 4))
 
     # Step 1.5: Boost table documents if table query
     if table_query:
         initial_docs = boost_table_docs(initial_docs, table_query)
         table_count = sum(1 for d in initial_docs if d.metadata.get("has_table", False))
-        print(f" {table_count} documents contain tables")
-
-    # Step 2: Rerank with Cohere
-    start_rerank = time.time()
-    top_k = 4 if table_query else 3  # Get more context for table queries
-    reranked_docs = rerank_with_cohere(body.question, initial_docs, top_k=top_k, is_table_query=table_query)
-    end_rerank = time.time()
-    rerank_time = round(end_rerank - start_rerank, 4)
+        trace_attr("table_candidates", table_count)
+
+    # Step 2: Rerank with Cohere, unless the dense ranking is already decisive
+    # (judged on everything retrieved, not just the adaptive cut)
+    rerank_skipped = rerank_is_decisive(retrieved, top_k)
+    with span("rerank"):
+        if rerank_skipped:
+            reranked_docs = boost_table_docs([doc for doc, _ in scored_docs[:top_k]], table_query)
+        else:
+            reranked_docs = rerank_with_cohere(body.question, initial_docs, top_k=top_k, is_table_query=table_query)
+    rerank_time = span_seconds("rerank")
     
-    print(f"⏱️  Cohere Reranking: {rerank_time}s")
-    print(f"✅ Selected {len(reranked_docs)} most relevant documents")
+    RERANK_DECISIONS.labels(decision="skipped" if rerank_skipped else "reranked").inc()
+    trace_attr("rerank_skipped", rerank_skipped)
+    if rerank_skipped:
+        RERANK_SECONDS_SAVED.inc(_rerank_seconds or 0.0)
+    
+    DOCS_AFTER_THRESHOLD.observe(len(reranked_docs))
+    trace_attr("docs_after_threshold", len(reranked_docs))
 
     # Check if we have any relevant documents
     if not reranked_docs:
-        import json
         error_response = {
             "answer": "I couldn't find any relevant information in the document to answer your question. Please try rephrasing your question or ask about a different topic.",
             "locations": [],
             "summary": "No relevant information found",
             "retrieval_time": retrieval_time,
             "rerank_time": rerank_time,
-            "query_type": "table" if table_query else "text"
+            "query_type": query_type,
+            "request_id": request_id_var.get()
         }
-        return {"response": json.dumps(error_response)}
+        finish_query(query_type, "no_results", query_start, trace)
+        return error_response
 
     # Step 3: Process retrieved documents
-    print(f"\n=== Top {len(reranked_docs)} Documents ===")
     locations = []
     
     for idx, d in enumerate(reranked_docs, 1):
@@ -309,10 +561,6 @@ async def query_doc(body: QueryRequest):
         source = meta_normalized.get("source", "Unknown")
         has_table = meta.get("has_table", False)
 
-        table_marker = "📊" if has_table else "📄"
-        print(f"\n[Doc {idx}] {table_marker} Page {page}")
-        print(f"Preview: {d.page_content[:150]}...")
-
         locations.append({
             "page": page,
             "pageIndex": page - 1 if isinstance(page, int) else 0,
@@ -326,21 +574,21 @@ async def query_doc(body: QueryRequest):
             "highlightText": d.page_content
         })
 
-    # Build context with table awareness
-    context = format_context_with_tables(reranked_docs)
+    # Build context (overlapping chunks merged, fitted to the token budget)
+    # and prompt with table awareness
+    with span("prompt_build"):
+        context, context_stats = build_context(reranked_docs, CONTEXT_TOKEN_BUDGET, CONTEXT_MERGE_GAP)
+        prompt = build_prompt(body.question, context, table_query)
+    
+    CONTEXT_TOKENS.observe(context_stats["context_tokens"])
+    CONTEXT_TOKENS_SAVED.inc(context_stats["tokens_saved"])
+    trace_attr("context", context_stats)
 
     # Step 4: Generate answer with Gemini
-    start_generation = time.time()
-    
     try:
-        answer = generate_answer_with_gemini(body.question, context, table_query)
-        
-        
-        end_generation = time.time()
-        generation_time = round(end_generation - start_generation, 4)
-        
-        print(f"⏱️  Gemini Generation: {generation_time}s")
-        print(f"\n✅ Answer: {answer[:200]}...")
+        with span("generate"):
+            answer = generate_answer_with_gemini(prompt, table_query)
+        generation_time = span_seconds("generate")
 
         # Create enhanced summary
         table_count = sum(1 for loc in locations if loc.get("has_table", False))
@@ -357,30 +605,78 @@ async def query_doc(body: QueryRequest):
             "summary": summary,
             "retrieval_time": retrieval_time,
             "rerank_time": rerank_time,
+            "rerank_skipped": rerank_skipped,
             "generation_time": generation_time,
             "total_time": round(retrieval_time + rerank_time + generation_time, 4),
             "model_used": GEMINI_MODEL,
-            "query_type": "table" if table_query else "text",
+            "query_type": query_type,
             "documents_analyzed": len(reranked_docs),
-            "tables_found": table_count
+            "tables_found": table_count,
+            "context_tokens": context_stats["context_tokens"],
+            "context_tokens_saved": context_stats["tokens_saved"],
+            "request_id": request_id_var.get()
         }
 
-        import json
-        return {"response": json.dumps(response_data)}
+        status = "llm_error" if "generation_error" in trace["attrs"] else "ok"
+        if status == "ok" and cacheable:
+            ANSWER_CACHE.set(query_key(body), response_data, tag=body.collection)
+        finish_query(query_type, status, query_start, trace)
+        return response_data
 
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        import json
+        logger.exception("query failed", extra={"error": str(e)})
         
         error_response = {
             "answer": "I encountered an error while processing your question. Please try again.",
             "locations": locations,
             "summary": "Error occurred during processing",
-            "error": str(e)
+            "error": str(e),
+            "request_id": request_id_var.get()
         }
         
-        
-        return {"response": json.dumps(error_response)}
\ No newline at end of file
+        finish_query(query_type, "error", query_start, trace)
+        return error_response
+
+# Identical questions arriving while one is being answered share its result
+QUERY_FLIGHTS = SingleFlight()
+
+def normalize_question(question: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    return " ".join(question.casefold().split()).rstrip(" ?!.")
+
+def query_key(body: QueryRequest) -> tuple:
+    """Coalescing key: (collection, normalized question, remaining parameters)"""
+    params = body.model_dump(exclude={"question", "collection"})
+    return (body.collection, normalize_question(body.question), tuple(sorted(params.items())))
+
+async def answer_query(body: QueryRequest) -> dict:
+    """
+    Answer a question from the shared answer cache, or by joining an identical
+    in-flight computation if one exists. Each caller gets its own copy of the
+    payload tagged with its request ID.
+    """
+    cached = ANSWER_CACHE.get(query_key(body))
+    if cached is not None:
+        touch_collection(body.collection)
+        logger.info("answered from shared cache", extra={"collection": body.collection, "origin_request_id": cached.get("request_id")})
+        return {**cached, "request_id": request_id_var.get(), "cached": True}
+    
+    # Run the blocking pipeline off the event loop so concurrent queries
+    # and upload handling are not serialised behind one request.
+    payload, shared = await QUERY_FLIGHTS.do(
+        query_key(body), lambda: run_in_threadpool(run_query_pipeline, body)
+    )
+    if not shared:
+        return payload
+    
+    QUERY_COALESCED.inc()
+    logger.info("joined in-flight query", extra={"collection": body.collection, "origin_request_id": payload.get("request_id")})
+    return {**payload, "request_id": request_id_var.get(), "coalesced": True}
+
+@router.post("/query")
+async def query_doc(body: QueryRequest):
+    """
+    Enhanced query endpoint with table-aware retrieval and generation
+    """
+    payload = await answer_query(body)
+    return {"response": json.dumps(payload)}
@@ -0,0 +1,209 @@
+# ratelimit.py - Client-side token-bucket scheduler for Cohere and Gemini calls
+#
+# Each provider has one bucket per quota window (e.g. Gemini: 15/minute and
+# 1500/day). Bucket state lives in a WAL-mode SQLite file and every token is
+# taken in one IMMEDIATE transaction, so all worker processes on the host
+# draw from the same quota instead of each spending the full limit. Callers
+# queue for a token up to a deadline; if the token cannot arrive in time they
+# get QuotaExhausted immediately and the caller degrades (local rerank, error text).
+
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import (
+    PROVIDER_QUOTAS,
+    QUOTA_DB_PATH,
+    RATE_LIMIT_BACKOFF_BASE,
+    RATE_LIMIT_BACKOFF_CAP,
+    RATE_LIMIT_MAX_RETRIES,
+)
+from telemetry import PROVIDER_CALLS, PROVIDER_QUEUE_WAIT, PROVIDER_QUOTA_REMAINING, get_logger, on_scrape
+
+logger = get_logger("ratelimit")
+
+WINDOW_SECONDS = {"minute": 60, "day": 86_400, "month": 30 * 86_400}
+
+_lock = threading.Lock()
+# Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+_conn = sqlite3.connect(QUOTA_DB_PATH, check_same_thread=False, timeout=5.0, isolation_level=None)
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.execute("""
+    CREATE TABLE IF NOT EXISTS quota_buckets (
+        provider TEXT NOT NULL,
+        window TEXT NOT NULL,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (provider, window)
+    )
+""")
+
+
+class QuotaExhausted(Exception):
+    """No token can be obtained for the provider before the caller's deadline"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} quota exhausted, retry after {retry_after:.1f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled evenly over `window` seconds (wall clock)"""
+
+    def __init__(self, capacity: int, window: float):
+        self.capacity = float(capacity)
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.updated = time.time()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, reserve: float = 0.0) -> float:
+        """
+        Seconds until one token is available (0 if available now) while
+        leaving `reserve` (a share of the capacity) in the bucket
+        """
+        needed = 1 + reserve * self.capacity
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class ProviderQuota:
+    """All quota windows of one provider, stored in the shared quota database"""
+
+    def __init__(self, name: str, limits: dict):
+        self.name = name
+        self.buckets = {
+            window: TokenBucket(limit, WINDOW_SECONDS[window])
+            for window, limit in limits.items()
+        }
+
+    @contextmanager
+    def shared_buckets(self):
+        """
+        The buckets as stored, refilled to now; changes made inside the block
+        are written back in the same transaction
+        """
+        with _lock:
+            _conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored = {
+                    window: (tokens, updated) for window, tokens, updated in _conn.execute(
+                        "SELECT window, tokens, updated FROM quota_buckets WHERE provider = ?", (self.name,)
+                    )
+                }
+                now = time.time()
+                for window, bucket in self.buckets.items():
+                    # Windows seen for the first time start full
+                    tokens, bucket.updated = stored.get(window, (bucket.capacity, now))
+                    bucket.tokens = min(tokens, bucket.capacity)
+                    bucket.refill(now)
+                yield self.buckets
+                _conn.executemany(
+                    "INSERT OR REPLACE INTO quota_buckets (provider, window, tokens, updated) VALUES (?, ?, ?, ?)",
+                    [(self.name, window, bucket.tokens, bucket.updated) for window, bucket in self.buckets.items()],
+                )
+                _conn.execute("COMMIT")
+            except BaseException:
+                _conn.execute("ROLLBACK")
+                raise
+
+    def report(self):
+        """Publish the tokens left in every window"""
+        with self.shared_buckets() as buckets:
+            for window, bucket in buckets.items():
+                PROVIDER_QUOTA_REMAINING.labels(provider=self.name, window=window).set(bucket.tokens)
+
+    def acquire(self, timeout: float, reserve: float = 0.0):
+        """Take one token from every window, waiting at most `timeout` seconds"""
+        start = time.monotonic()
+        deadline = start + timeout
+        while True:
+            with self.shared_buckets() as buckets:
+                wait = max(bucket.wait_time(reserve) for bucket in buckets.values())
+                if wait == 0:
+                    for bucket in buckets.values():
+                        bucket.tokens -= 1
+            now = time.monotonic()
+            if wait == 0:
+                PROVIDER_QUEUE_WAIT.labels(provider=self.name).observe(now - start)
+                return
+            if now + wait > deadline:
+                PROVIDER_CALLS.labels(provider=self.name, outcome="throttled").inc()
+                raise QuotaExhausted(self.name, wait)
+            # Another process may take the token first; then wait again
+            time.sleep(wait)
+
+    def penalize(self):
+        """Provider answered 429: stop handing out short-window tokens for now"""
+        with self.shared_buckets() as buckets:
+            for window, bucket in buckets.items():
+                if window == "minute":
+                    bucket.drain()
+
+
+class RateLimitScheduler:
+    def __init__(self, quotas: dict):
+        self.providers = {name: ProviderQuota(name, limits) for name, limits in quotas.items()}
+
+    def report(self):
+        for quota in self.providers.values():
+            quota.report()
+
+    def call(self, provider: str, fn, *args, timeout: float = None, reserve: float = 0.0, **kwargs):
+        """
+        Run `fn` under the provider's quota, retrying 429s with jittered
+        exponential backoff. Raises QuotaExhausted when the deadline is hit.
+        Background work passes a `reserve` so it never takes the last share
+        of a window from interactive callers.
+        """
+        quota = self.providers[provider]
+        timeout = PROVIDER_QUOTAS[provider]["queue_timeout"] if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            quota.acquire(max(0.0, deadline - time.monotonic()), reserve)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    PROVIDER_CALLS.labels(provider=provider, outcome="error").inc()
+                    raise
+                PROVIDER_CALLS.labels(provider=provider, outcome="rate_limited").inc()
+                quota.penalize()
+                backoff = random.uniform(0, min(RATE_LIMIT_BACKOFF_CAP, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+                logger.warning(
+                    "provider rate limited, backing off",
+                    extra={"provider": provider, "attempt": attempt + 1, "backoff_s": round(backoff, 3)},
+                )
+                if attempt == RATE_LIMIT_MAX_RETRIES or time.monotonic() + backoff > deadline:
+                    raise QuotaExhausted(provider, backoff) from e
+                time.sleep(backoff)
+                continue
+            PROVIDER_CALLS.labels(provider=provider, outcome="ok").inc()
+            return result
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Recognise 429 / RESOURCE_EXHAUSTED from the Cohere and Gemini SDKs"""
+    for attr in ("status_code", "code", "status"):
+        if getattr(error, attr, None) in (429, "429", "RESOURCE_EXHAUSTED"):
+            return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "rate limit" in text.lower()
+
+
+scheduler = RateLimitScheduler(
+    {name: quota["limits"] for name, quota in PROVIDER_QUOTAS.items()}
+)
+
+on_scrape(scheduler.report)
@@ -0,0 +1,302 @@
+# registry.py - Collection registry, idle-TTL garbage collection and storage accounting
+#
+# Every ingested document is recorded in a local SQLite database with its
+# creation time, last query time, size and source hash. A collection is
+# reserved ("ingesting") before anything is written for it and marked
+# "ready" once ingestion completes, so storage left by a failed or crashed
+# ingestion is always owned by a registry row. A background loop (started
+# from main.py) evicts collections idle longer than COLLECTION_TTL_SECONDS,
+# optionally snapshotting them first, sweeps reservations older than
+# INGEST_STALE_SECONDS, and runs the registered eviction hooks so
+# query-side caches forget the collection too. Every worker runs the loop,
+# but only the holder of the "gc" lease collects.
+
+import asyncio
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Header
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    ADMIN_TOKEN,
+    COLLECTION_TTL_SECONDS,
+    GC_INTERVAL_SECONDS,
+    GC_MODE,
+    INGEST_STALE_SECONDS,
+    PAGE_INDEX_SUFFIX,
+    REGISTRY_DB_PATH,
+    REGISTRY_TOUCH_INTERVAL,
+)
+from embeddings import qdrant_client
+from telemetry import COLLECTIONS_EVICTED, REGISTERED_COLLECTIONS, get_logger, on_scrape
+
+router = APIRouter()
+logger = get_logger("registry")
+
+_lock = threading.Lock()
+_conn = sqlite3.connect(REGISTRY_DB_PATH, check_same_thread=False)
+_conn.row_factory = sqlite3.Row
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.execute("""
+    CREATE TABLE IF NOT EXISTS collections (
+        name TEXT PRIMARY KEY,
+        filename TEXT,
+        source_hash TEXT,
+        created_at REAL NOT NULL,
+        last_query_at REAL,
+        points INTEGER NOT NULL DEFAULT 0,
+        vector_bytes INTEGER NOT NULL DEFAULT 0,
+        payload_bytes INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'ready'
+    )
+""")
+if "status" not in {row["name"] for row in _conn.execute("PRAGMA table_info(collections)")}:
+    # Registries created before reservations only hold finished documents
+    _conn.execute("ALTER TABLE collections ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'")
+_conn.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    )
+""")
+_conn.commit()
+
+
+def count_collections() -> int:
+    with _lock:
+        return _conn.execute("SELECT COUNT(*) FROM collections").fetchone()[0]
+
+
+on_scrape(lambda: REGISTERED_COLLECTIONS.set(count_collections()))
+
+# Last touch written per collection, to keep queries from writing on every hit
+_last_touch: Dict[str, float] = {}
+
+_evict_hooks: List[Callable[[str], None]] = []
+_register_hooks: List[Callable[[str], None]] = []
+
+
+def on_evict(hook: Callable[[str], None]):
+    """Register a callback run with the collection name after eviction"""
+    _evict_hooks.append(hook)
+
+
+def on_register(hook: Callable[[str], None]):
+    """Register a callback run with the collection name once its ingestion completes"""
+    _register_hooks.append(hook)
+
+
+def reserve_collection(name: str, filename: str, source_hash: Optional[str]):
+    """Record a document whose ingestion is starting, before its collection is created"""
+    with _lock:
+        _conn.execute(
+            """INSERT OR REPLACE INTO collections (name, filename, source_hash, created_at, status)
+               VALUES (?, ?, ?, ?, 'ingesting')""",
+            (name, filename, source_hash, time.time()),
+        )
+        _conn.commit()
+
+
+def register_collection(name: str, filename: str, source_hash: Optional[str],
+                        points: int, vector_size: int, payload_bytes: int, index_vectors: int = 0):
+    """Record a stored document; index_vectors counts auxiliary vectors (page index)"""
+    with _lock:
+        _conn.execute(
+            """INSERT OR REPLACE INTO collections
+               (name, filename, source_hash, created_at, last_query_at, points, vector_bytes, payload_bytes, status)
+               VALUES (?, ?, ?, ?, NULL, ?, ?, ?, 'ready')""",
+            (name, filename, source_hash, time.time(), points, (points + index_vectors) * vector_size * 4, payload_bytes),
+        )
+        _conn.commit()
+    for hook in _register_hooks:
+        hook(name)
+
+
+def touch_collection(name: str):
+    """Record a query against the collection (at most once per REGISTRY_TOUCH_INTERVAL)"""
+    now = time.time()
+    if now - _last_touch.get(name, 0.0) < REGISTRY_TOUCH_INTERVAL:
+        return
+    _last_touch[name] = now
+    with _lock:
+        _conn.execute("UPDATE collections SET last_query_at = ? WHERE name = ?", (now, name))
+        _conn.commit()
+
+
+def get_collection(name: str) -> Optional[dict]:
+    with _lock:
+        row = _conn.execute("SELECT * FROM collections WHERE name = ?", (name,)).fetchone()
+    return dict(row) if row else None
+
+
+def is_ingesting(name: str) -> bool:
+    """True while the collection is reserved but not yet registered (results are partial)"""
+    with _lock:
+        row = _conn.execute("SELECT status FROM collections WHERE name = ?", (name,)).fetchone()
+    return bool(row) and row["status"] == "ingesting"
+
+
+def list_collections() -> List[dict]:
+    with _lock:
+        rows = _conn.execute("SELECT * FROM collections ORDER BY created_at").fetchall()
+    return [dict(row) for row in rows]
+
+
+def drop_collection(name: str, mode: str = "delete") -> Optional[str]:
+    """Delete a collection and everything stored with it; returns the snapshot name in 'archive' mode"""
+    snapshot = None
+    if qdrant_client.collection_exists(name):
+        if mode == "archive":
+            description = qdrant_client.create_snapshot(collection_name=name)
+            snapshot = getattr(description, "name", None)
+        qdrant_client.delete_collection(name)
+
+    with _lock:
+        _conn.execute("DELETE FROM collections WHERE name = ?", (name,))
+        _conn.commit()
+    _last_touch.pop(name, None)
+
+    for hook in _evict_hooks:
+        try:
+            hook(name)
+        except Exception as e:
+            logger.warning("eviction hook failed", extra={"collection": name, "error": str(e)})
+    return snapshot
+
+
+def evict_collection(name: str, mode: str = GC_MODE) -> dict:
+    """
+    Drop a collection from Qdrant ('archive' snapshots it first), remove it
+    from the registry and run the eviction hooks.
+    """
+    snapshot = drop_collection(name, mode)
+    COLLECTIONS_EVICTED.labels(mode=mode).inc()
+    logger.info("collection evicted", extra={"collection": name, "mode": mode, "snapshot": snapshot})
+    return {"collection": name, "mode": mode, "snapshot": snapshot}
+
+
+def collect_garbage(now: float = None) -> List[dict]:
+    """
+    Evict every registered collection idle for longer than COLLECTION_TTL_SECONDS,
+    and reservations whose ingestion died (INGEST_STALE_SECONDS)
+    """
+    now = now or time.time()
+    with _lock:
+        rows = _conn.execute(
+            """SELECT name FROM collections
+               WHERE (status = 'ready' AND COALESCE(last_query_at, created_at) < ?)
+                  OR (status = 'ingesting' AND created_at < ?)""",
+            (now - COLLECTION_TTL_SECONDS, now - INGEST_STALE_SECONDS),
+        ).fetchall()
+
+    evicted = []
+    for row in rows:
+        try:
+            evicted.append(evict_collection(row["name"]))
+        except Exception as e:
+            logger.error("failed to evict collection", extra={"collection": row["name"], "error": str(e)})
+    return evicted
+
+
+def claim_lease(name: str, seconds: float) -> bool:
+    """Take or renew a lease for this process; False while another live holder has it"""
+    now = time.time()
+    with _lock:
+        cursor = _conn.execute(
+            """INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE leases.owner = excluded.owner OR leases.expires_at < ?""",
+            (name, os.getpid(), now + seconds, now),
+        )
+        _conn.commit()
+    return cursor.rowcount > 0
+
+
+async def gc_loop():
+    """
+    Background task: run collect_garbage every GC_INTERVAL_SECONDS in one
+    worker. The lease outlives two intervals, so another worker takes over
+    only after the collecting one has stopped renewing it.
+    """
+    while True:
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
+        try:
+            if not await run_in_threadpool(claim_lease, "gc", 2 * GC_INTERVAL_SECONDS):
+                continue
+            evicted = await run_in_threadpool(collect_garbage)
+            if evicted:
+                logger.info("garbage collection finished", extra={"evicted": len(evicted)})
+        except Exception as e:
+            logger.exception("garbage collection failed", extra={"error": str(e)})
+
+
+def storage_report() -> dict:
+    """Registered collections plus any Qdrant collections the registry does not know"""
+    registered = {c["name"]: c for c in list_collections()}
+    now = time.time()
+    collections = []
+    for name, entry in registered.items():
+        idle = now - (entry["last_query_at"] or entry["created_at"])
+        collections.append({
+            **entry,
+            "storage_bytes": entry["vector_bytes"] + entry["payload_bytes"],
+            "idle_seconds": round(idle),
+            "expires_in_seconds": max(0, round(COLLECTION_TTL_SECONDS - idle)),
+        })
+
+    for description in qdrant_client.get_collections().collections:
+        # Page-vector collections are accounted with their document
+        if description.name.removesuffix(PAGE_INDEX_SUFFIX) not in registered:
+            collections.append({"name": description.name, "status": "unregistered"})
+
+    return {
+        "ttl_seconds": COLLECTION_TTL_SECONDS,
+        "gc_mode": GC_MODE,
+        "total_collections": len(collections),
+        "total_storage_bytes": sum(c.get("storage_bytes", 0) for c in collections),
+        "collections": collections,
+    }
+
+
+def _authorized(token: Optional[str]) -> bool:
+    # No configured token means the admin API is off, not open
+    return bool(ADMIN_TOKEN) and hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode())
+
+
+def _forbidden():
+    message = "Invalid admin token" if ADMIN_TOKEN else "Admin API is disabled (set ADMIN_TOKEN)"
+    return JSONResponse(status_code=403, content={"status": "error", "message": message})
+
+
+@router.get("/admin/collections")
+async def admin_list_collections(x_admin_token: Optional[str] = Header(None)):
+    if not _authorized(x_admin_token):
+        return _forbidden()
+    return await run_in_threadpool(storage_report)
+
+
+@router.delete("/admin/collections/{name}")
+async def admin_evict_collection(name: str, mode: str = GC_MODE, x_admin_token: Optional[str] = Header(None)):
+    if not _authorized(x_admin_token):
+        return _forbidden()
+    if mode not in ("delete", "archive"):
+        return JSONResponse(status_code=400, content={"status": "error", "message": "mode must be 'delete' or 'archive'"})
+    # Only documents this service registered; other collections on the cluster are not ours to drop
+    if not await run_in_threadpool(get_collection, name):
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Unknown collection '{name}'"})
+    return {"status": "success", **await run_in_threadpool(evict_collection, name, mode)}
+
+
+@router.post("/admin/gc")
+async def admin_run_gc(x_admin_token: Optional[str] = Header(None)):
+    if not _authorized(x_admin_token):
+        return _forbidden()
+    evicted = await run_in_threadpool(collect_garbage)
+    return {"status": "success", "evicted": evicted}
@@ -0,0 +1,73 @@
+# serve.py - Production entry point: several uvicorn worker processes, no reload
+#
+#   cd backend/doc_backend
+#   python serve.py --workers 4 --port 8000
+#
+# The app is imported once in the supervisor before the workers start, so
+# one-time work (model downloads, SQLite schema creation) is not raced by N
+# workers. Workers share the registry, ingestion jobs, table store and
+# answer/embedding/summary cache through their SQLite files, and write their
+# Prometheus samples to a multiprocess directory that /metrics aggregates.
+# On SIGTERM/SIGINT each worker stops accepting connections, finishes
+# in-flight requests and drains its running ingestion jobs for up to
+# SHUTDOWN_DRAIN_SECONDS before exiting.
+
+import argparse
+import importlib
+import os
+import tempfile
+
+import uvicorn
+
+from config import METRICS_DIR, SERVE_HOST, SERVE_PORT, SERVE_WORKERS, SHUTDOWN_DRAIN_SECONDS
+
+
+def preload(app_path: str):
+    """Import the application module (and everything it initialises) once"""
+    module_name, _, _ = app_path.partition(":")
+    importlib.import_module(module_name)
+
+
+def prepare_metrics_dir(path: str):
+    """
+    Empty PROMETHEUS_MULTIPROC_DIR for this run (files of earlier runs would
+    be summed in) and export it; prometheus_client reads it at import
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run DocuSleuth with multiple workers")
+    parser.add_argument("--app", default="main:app", help="ASGI app import string")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--no-preload", action="store_true", help="let every worker initialise on its own")
+    parser.add_argument("--metrics-dir", default=METRICS_DIR, help="PROMETHEUS_MULTIPROC_DIR for the workers")
+    args = parser.parse_args(argv)
+
+    prepare_metrics_dir(args.metrics_dir or os.path.join(tempfile.gettempdir(), f"docusleuth-metrics-{args.port}"))
+    # Workers size their parse/OCR process pools by their share of the host
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    if not args.no_preload:
+        preload(args.app)
+    # After prepare_metrics_dir: telemetry imports prometheus_client
+    from telemetry import configure_logging
+    configure_logging()  # The supervisor's own uvicorn logs; workers configure theirs when importing the app
+
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=SHUTDOWN_DRAIN_SECONDS,
+        log_config=None,  # telemetry.configure_logging() routes uvicorn's loggers through the JSON handlers
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# shared_cache.py - SQLite-backed key/value cache shared by every worker process
+#
+# In-process dicts are lost per worker: with N workers an answer computed in
+# one is recomputed in the others. Entries here live in one WAL-mode SQLite
+# file, so any worker on the host can read what another wrote. Values are
+# JSON, keys are namespaced, every entry has a TTL, and entries can carry a
+# tag (the collection) so they can be invalidated together.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from config import SHARED_CACHE_PATH
+from registry import on_evict, on_register
+from telemetry import SHARED_CACHE_REQUESTS, get_logger
+
+logger = get_logger("cache")
+
+PURGE_INTERVAL = 60  # Seconds between expired-entry sweeps per process
+
+_lock = threading.Lock()
+_conn = sqlite3.connect(SHARED_CACHE_PATH, check_same_thread=False, timeout=5.0)
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.execute("PRAGMA synchronous=NORMAL")
+_conn.execute("""
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        tag TEXT,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+""")
+_conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_tag ON cache (tag)")
+_conn.commit()
+
+_last_purge = 0.0
+
+
+def _purge(now: float):
+    global _last_purge
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+    _conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+
+class SharedCache:
+    """One namespace of the shared cache; disabled when ttl is 0"""
+
+    def __init__(self, namespace: str, ttl: float):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key: Any) -> str:
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def get(self, key: Any) -> Optional[Any]:
+        if not self.ttl:
+            return None
+        try:
+            with _lock:
+                row = _conn.execute(
+                    "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (self._key(key), time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("shared cache read failed", extra={"namespace": self.namespace, "error": str(e)})
+            row = None
+        SHARED_CACHE_REQUESTS.labels(namespace=self.namespace, result="hit" if row else "miss").inc()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: Any, value: Any, tag: Optional[str] = None):
+        if not self.ttl:
+            return
+        now = time.time()
+        try:
+            with _lock:
+                _conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, tag, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self._key(key), tag, json.dumps(value), now + self.ttl),
+                )
+                _purge(now)
+                _conn.commit()
+        except sqlite3.Error as e:
+            # A busy or read-only cache only costs a recomputation
+            logger.warning("shared cache write failed", extra={"namespace": self.namespace, "error": str(e)})
+
+
+def invalidate_tag(tag: str):
+    """Drop every entry tagged with `tag`, in all namespaces"""
+    with _lock:
+        _conn.execute("DELETE FROM cache WHERE tag = ?", (tag,))
+        _conn.commit()
+
+on_evict(invalidate_tag)
+# A re-ingested document must not be answered from the previous version's entries
+on_register(invalidate_tag)
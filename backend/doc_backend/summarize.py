@@ -1,13 +1,283 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
 from fastapi import APIRouter
+from langchain_core.documents import Document
+from pydantic import BaseModel
+from qdrant_client.models import FieldCondition, Filter, Range
+from starlette.concurrency import run_in_threadpool
+
+import query
+from config import (
+    SUMMARY_CACHE_TTL,
+    SUMMARY_LLM_TIMEOUT,
+    SUMMARY_MAX_CONCURRENCY,
+    SUMMARY_MAX_LLM_CALLS,
+    SUMMARY_PAGE_TOKEN_LIMIT,
+    SUMMARY_PAGES_PER_CALL,
+    SUMMARY_QUOTA_RESERVE,
+    SUMMARY_REDUCE_FANIN,
+)
+from context_builder import CHARS_PER_TOKEN, merge_chunks
+from embeddings import qdrant_client
+from ratelimit import QuotaExhausted
+from registry import is_ingesting, touch_collection
+from shared_cache import SharedCache
+from singleflight import SingleFlight
+from telemetry import get_logger, span, start_trace
 
 router = APIRouter()
+logger = get_logger("summarize")
+
+PAGE_SUMMARY_PROMPT = """Summarize the following pages {first}-{last} of a document in 3-6 sentences.
+Keep key facts, figures and names. If a page contains a table, state what it lists and its notable values.
+Do not add information that is not on the pages.
+
+{text}"""
+
+REDUCE_PROMPT = """Combine the following summaries of consecutive parts of a document (pages {first}-{last}) into one coherent summary.
+Keep the most important facts and figures, remove repetition and keep the document's order.
+
+{summaries}"""
+
+# Section summaries keyed by (collection, first_page, last_page) and tagged
+# with the collection, so every worker reuses them and eviction drops them
+# for all. Map calls cover aligned blocks of SUMMARY_PAGES_PER_CALL pages and
+# reduce nodes aligned groups of SUMMARY_REDUCE_FANIN blocks (then blocks of
+# blocks), so any page range that contains a whole block or group reuses its summary.
+# Finished responses are also cached under (collection, "request", page_start,
+# page_end), so a repeated request is answered without scrolling the collection.
+SUMMARY_CACHE = SharedCache("summary", SUMMARY_CACHE_TTL)
+
+SUMMARY_FLIGHTS = SingleFlight()
+
+
+class SummarizeRequest(BaseModel):
+    collection: str
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+
+
+def page_range_filter(first: Optional[int], last: Optional[int]) -> Optional[Filter]:
+    """Chunks on pages first..last (either bound may be open)"""
+    if first is None and last is None:
+        return None
+    return Filter(must=[FieldCondition(key="metadata.page", range=Range(gte=first, lte=last))])
+
+
+def load_page_texts(collection: str, first: Optional[int] = None, last: Optional[int] = None) -> Dict[int, str]:
+    """Rebuild page texts from the stored chunks (overlaps spliced out), only for pages first..last"""
+    docs = []
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection,
+            scroll_filter=page_range_filter(first, last),
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            docs.append(Document(
+                page_content=payload.get("page_content", ""),
+                metadata=payload.get("metadata", {}),
+            ))
+        if offset is None:
+            break
+
+    spans, _ = merge_chunks(docs)
+    pages: Dict[int, List] = {}
+    for s in spans:
+        if isinstance(s.page, int):
+            pages.setdefault(s.page, []).append(s)
+    return {
+        page: "\n".join(s.text for s in sorted(page_spans, key=lambda s: s.start or 0))
+        for page, page_spans in sorted(pages.items())
+    }
+
+
+async def call_llm(prompt: str, max_output_tokens: int, limiter: asyncio.Semaphore, stats: dict) -> str:
+    async with limiter:
+        # Summaries are bulk work: they leave SUMMARY_QUOTA_RESERVE of every
+        # Gemini window to /query instead of starving it for the whole run
+        text, _ = await run_in_threadpool(
+            query.generate_text, prompt, max_output_tokens, SUMMARY_LLM_TIMEOUT, SUMMARY_QUOTA_RESERVE
+        )
+    stats["llm_calls"] += 1
+    if not text:
+        raise RuntimeError("the model returned no text (the response may have been blocked)")
+    return text.strip()
+
+
+def page_blocks(pages: List[int]) -> List[tuple]:
+    """
+    [(block_index, [pages])]: the requested pages grouped into absolute
+    blocks of SUMMARY_PAGES_PER_CALL (1-4, 5-8, ... for 4), so the same
+    block gets the same cache key whatever range it was requested in
+    """
+    blocks: Dict[int, List[int]] = {}
+    for page in pages:
+        blocks.setdefault((page - 1) // SUMMARY_PAGES_PER_CALL, []).append(page)
+    return sorted(blocks.items())
+
+
+def group_sections(level: List[tuple]) -> List[tuple]:
+    """
+    [(parent_index, [sections])] for one reduce level. Sections are
+    (index, first_page, last_page, ...) and are grouped by index // fan-in,
+    i.e. aligned to absolute groups rather than to the start of the range.
+    """
+    groups: Dict[int, List[tuple]] = {}
+    for section in level:
+        groups.setdefault(section[0] // SUMMARY_REDUCE_FANIN, []).append(section)
+    return sorted(groups.items())
+
+
+def count_llm_calls(collection: str, blocks: List[tuple]) -> int:
+    """LLM calls a summary of `blocks` still needs, given the cached sections"""
+    calls = sum(SUMMARY_CACHE.get((collection, pages[0], pages[-1])) is None for _, pages in blocks)
+    level = [(index, pages[0], pages[-1]) for index, pages in blocks]
+    while len(level) > 1:
+        level = [(index, group[0][1], group[-1][2]) for index, group in group_sections(level)]
+        calls += sum(SUMMARY_CACHE.get((collection, first, last)) is None for _, first, last in level)
+    return calls
+
+
+async def summarize_block(collection: str, index: int, pages: List[int], page_texts: Dict[int, str],
+                          limiter, stats: dict, cacheable: bool = True) -> tuple:
+    key = (pages[0], pages[-1])
+    summary = SUMMARY_CACHE.get((collection, *key))
+    if summary is None:
+        text = "\n\n".join(
+            f"Page {page}:\n{page_texts[page][: SUMMARY_PAGE_TOKEN_LIMIT * CHARS_PER_TOKEN]}" for page in pages
+        )
+        prompt = PAGE_SUMMARY_PROMPT.format(first=key[0], last=key[1], text=text)
+        summary = await call_llm(prompt, 384, limiter, stats)
+        if cacheable:
+            SUMMARY_CACHE.set((collection, *key), summary, tag=collection)
+    else:
+        stats["cached_sections"] += 1
+    return (index, *key, summary)
+
+
+async def reduce_summaries(collection: str, sections: List[tuple], limiter, stats: dict,
+                           cacheable: bool = True) -> str:
+    """
+    Hierarchical reduce: fold aligned groups of SUMMARY_REDUCE_FANIN
+    sections level by level until one summary remains. Groups on a level
+    run concurrently; each node is cached by the page span it covers.
+    """
+    level = sections  # [(index, first_page, last_page, summary)]
+    while len(level) > 1:
+
+        async def fold(index, group):
+            if len(group) == 1:
+                return (index, *group[0][1:])
+            key = (group[0][1], group[-1][2])
+            summary = SUMMARY_CACHE.get((collection, *key))
+            if summary is not None:
+                stats["cached_sections"] += 1
+                return (index, *key, summary)
+            joined = "\n\n".join(f"Pages {first}-{last}:\n{summary}" for _, first, last, summary in group)
+            prompt = REDUCE_PROMPT.format(first=key[0], last=key[1], summaries=joined)
+            summary = await call_llm(prompt, 512, limiter, stats)
+            if cacheable:
+                SUMMARY_CACHE.set((collection, *key), summary, tag=collection)
+            return (index, *key, summary)
+
+        level = list(await asyncio.gather(*[fold(index, group) for index, group in group_sections(level)]))
+    return level[0][3]
+
+
+async def summarize_range(collection: str, page_start: Optional[int], page_end: Optional[int]) -> dict:
+    start = time.perf_counter()
+    trace = start_trace()
+    stats = {"llm_calls": 0, "cached_sections": 0}
+
+    touch_collection(collection)
+    # Summaries of a half-ingested document are returned but never cached
+    cacheable = not is_ingesting(collection)
+    request_key = (collection, "request", page_start, page_end)
+    cached = SUMMARY_CACHE.get(request_key) if cacheable else None
+    if cached is not None:
+        return {**cached, "llm_calls": 0, "cached_sections": 1, "time": round(time.perf_counter() - start, 4)}
+
+    with span("load_pages", pipeline="summarize"):
+        page_texts = await run_in_threadpool(load_page_texts, collection, page_start, page_end)
+    if not page_texts:
+        if page_start is not None or page_end is not None:
+            return {"status": "error", "message": f"No pages between {page_start or 1} and {page_end or 'the end'}"}
+        return {"status": "error", "message": f"No content found for collection '{collection}'"}
+
+    pages = sorted(page_texts)
+
+    summary = SUMMARY_CACHE.get((collection, pages[0], pages[-1]))
+    if summary is not None:
+        stats["cached_sections"] += 1
+    else:
+        blocks = page_blocks(pages)
+        needed = count_llm_calls(collection, blocks)
+        if needed > SUMMARY_MAX_LLM_CALLS:
+            return {
+                "status": "error",
+                "message": f"Pages {pages[0]}-{pages[-1]} need {needed} summary calls, more than the limit of "
+                           f"{SUMMARY_MAX_LLM_CALLS}. Please summarize a smaller page range (page_start/page_end).",
+            }
+        limiter = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+        with span("map", pipeline="summarize"):
+            sections = await asyncio.gather(*[
+                summarize_block(collection, index, block, page_texts, limiter, stats, cacheable)
+                for index, block in blocks
+            ])
+        with span("reduce", pipeline="summarize"):
+            summary = await reduce_summaries(collection, list(sections), limiter, stats, cacheable)
+
+    elapsed = round(time.perf_counter() - start, 4)
+    logger.info(
+        "summary completed",
+        extra={"collection": collection, "pages": len(pages), "duration_s": elapsed,
+               "spans": trace["spans"], **stats},
+    )
+    result = {
+        "status": "success",
+        "collection": collection,
+        "page_start": pages[0],
+        "page_end": pages[-1],
+        "summary": summary,
+        "pages_summarized": len(pages),
+    }
+    if cacheable:
+        SUMMARY_CACHE.set(request_key, result, tag=collection)
+    return {
+        **result,
+        "llm_calls": stats["llm_calls"],
+        "cached_sections": stats["cached_sections"],
+        "time": elapsed,
+    }
+
+
 
 @router.post("/summarize")
-async def summarize_document():
+async def summarize_document(body: SummarizeRequest):
     """
-    This is a summarize endpoint
+    Map-reduce document summary: blocks of pages are summarized concurrently
+    (bounded by SUMMARY_MAX_CONCURRENCY and the Gemini rate limiter), then
+    reduced hierarchically. Block and section summaries are cached per collection.
     """
-    
-    
-    
-    
\ No newline at end of file
+    try:
+        result, _ = await SUMMARY_FLIGHTS.do(
+            (body.collection, body.page_start, body.page_end),
+            lambda: summarize_range(body.collection, body.page_start, body.page_end),
+        )
+        return result
+    except QuotaExhausted as e:
+        return {
+            "status": "error",
+            "message": f"Summary service is at its request limit. Please try again in about {max(1, round(e.retry_after))} seconds.",
+        }
+    except Exception as e:
+        logger.exception("summary failed", extra={"collection": body.collection, "error": str(e)})
+        return {"status": "error", "message": f"Failed to summarize document: {str(e)}"}
@@ -0,0 +1,375 @@
+# table_store.py - Typed store of the markdown tables found at ingestion, plus a no-LLM lookup path
+#
+# Every table extract_tables_from_text() finds is parsed into a header and
+# rows and written to SQLite: one row per cell, with the raw text and, when
+# the cell parses as a number, its numeric value. Questions that name a row
+# and a column ("What was the revenue in 2021?") or ask for an aggregate of
+# one numeric column ("What is the total revenue?") are answered from here
+# in milliseconds; anything else returns None and takes the LLM path.
+# A match must account for most of the question's words, so prose questions
+# that merely mention a header ("Why did overall revenue fall?") are left to
+# the LLM, and explanatory questions are not looked up at all.
+
+import json
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import TABLE_DB_PATH, TABLE_MIN_COVERAGE
+from registry import on_evict
+from telemetry import get_logger
+
+logger = get_logger("tables")
+
+_lock = threading.Lock()
+_conn = sqlite3.connect(TABLE_DB_PATH, check_same_thread=False)
+_conn.execute("PRAGMA journal_mode=WAL")
+_conn.executescript("""
+    CREATE TABLE IF NOT EXISTS doc_tables (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        collection TEXT NOT NULL,
+        page INTEGER,
+        table_index INTEGER NOT NULL,
+        columns TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        markdown TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_doc_tables_collection ON doc_tables (collection);
+    CREATE TABLE IF NOT EXISTS table_cells (
+        table_id INTEGER NOT NULL REFERENCES doc_tables (id) ON DELETE CASCADE,
+        row_index INTEGER NOT NULL,
+        column_index INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        number REAL,
+        PRIMARY KEY (table_id, row_index, column_index)
+    );
+""")
+_conn.execute("PRAGMA foreign_keys=ON")
+_conn.commit()
+
+SEPARATOR_CELL = re.compile(r"^:?-{2,}:?$")
+NUMBER_PATTERN = re.compile(r"^-?(\d+(\.\d*)?|\.\d+)$")
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Words that carry no meaning when matching headers and row labels
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "of", "in", "on", "for", "to",
+    "and", "or", "what", "which", "who", "how", "does", "do", "did", "has", "have", "had", "about", "with",
+    "this", "that", "it", "be", "by", "as", "at", "from", "me", "show", "tell", "give",
+    "value", "table", "row", "column", "much", "many",
+}
+
+AGGREGATES = {
+    "sum": ("total", "sum", "overall", "combined"),
+    "avg": ("average", "avg", "mean"),
+    "max": ("highest", "maximum", "max", "largest", "biggest"),
+    "min": ("lowest", "minimum", "min", "smallest", "fewest"),
+    "count": ("count",),
+}
+
+SUMMARY_LABELS = {"total", "totals", "sum", "overall", "subtotal", "grand"}
+
+# Words that only say the answer is tabular; they need no header or label match
+TABLE_FILLER = {
+    "data", "values", "numbers", "number", "list", "listed", "chart", "figure",
+    "statistics", "stats", "shown", "according", "amount",
+}
+
+# Questions asking for an explanation rather than a value
+EXPLANATORY_WORDS = {
+    "why", "explain", "describe", "reason", "reasons", "cause", "causes", "impact",
+    "affect", "effect", "trend", "trends", "compare", "say", "says", "said", "mean", "means",
+}
+
+
+@dataclass
+class StoredTable:
+    id: int
+    page: Optional[int]
+    columns: List[str]
+    rows: List[List[str]]
+    markdown: str
+
+
+def words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def content_words(text: str) -> set:
+    return {w for w in words(text) if w not in STOPWORDS}
+
+
+def parse_number(value: str) -> Optional[float]:
+    """'1,234.5' / '$12' / '(40)' / '12.5%' -> float; None if not a plain number"""
+    text = value.strip().replace(",", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    text = text.strip("()").lstrip("$€£₹").rstrip("%")
+    if not NUMBER_PATTERN.match(text):
+        return None
+    number = float(text)
+    return -number if negative else number
+
+
+def split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.replace("<br>", " ").strip() for cell in line.split("|")]
+
+
+def parse_markdown_table(markdown: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Split a markdown table into (columns, rows). Without a separator line
+    after the first row there is no header, and columns are named col_1...
+    """
+    lines = [split_row(line) for line in markdown.strip().split("\n") if line.strip()]
+    if len(lines) >= 2 and lines[1] and all(SEPARATOR_CELL.match(c) for c in lines[1] if c):
+        header, body = lines[0], lines[2:]
+    else:
+        header, body = [], lines
+    body = [row for row in body if not all(SEPARATOR_CELL.match(c) or not c for c in row)]
+
+    width = max([len(header)] + [len(row) for row in body]) if (header or body) else 0
+    columns, seen = [], set()
+    for index in range(width):
+        name = header[index] if index < len(header) and header[index] else f"col_{index + 1}"
+        if name in seen:
+            name = f"{name}_{index + 1}"
+        seen.add(name)
+        columns.append(name)
+    rows = [row + [""] * (width - len(row)) for row in body]
+    return columns, rows
+
+
+def store_tables(collection: str, tables: List[Tuple[Optional[int], str]]) -> int:
+    """
+    Replace the stored tables of a collection with [(page, markdown), ...].
+    Returns the number of tables stored.
+    """
+    stored = 0
+    with _lock:
+        _conn.execute("DELETE FROM doc_tables WHERE collection = ?", (collection,))
+        for table_index, (page, markdown) in enumerate(tables):
+            columns, rows = parse_markdown_table(markdown)
+            if not columns or not rows:
+                continue
+            cursor = _conn.execute(
+                "INSERT INTO doc_tables (collection, page, table_index, columns, row_count, markdown) VALUES (?, ?, ?, ?, ?, ?)",
+                (collection, page, table_index, json.dumps(columns), len(rows), markdown),
+            )
+            _conn.executemany(
+                "INSERT INTO table_cells (table_id, row_index, column_index, value, number) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, r, c, value, parse_number(value))
+                    for r, row in enumerate(rows)
+                    for c, value in enumerate(row)
+                ],
+            )
+            stored += 1
+        _conn.commit()
+    return stored
+
+
+def delete_tables(collection: str):
+    with _lock:
+        _conn.execute("DELETE FROM doc_tables WHERE collection = ?", (collection,))
+        _conn.commit()
+
+on_evict(delete_tables)
+
+
+def load_tables(collection: str) -> List[StoredTable]:
+    with _lock:
+        table_rows = _conn.execute(
+            "SELECT id, page, columns, row_count, markdown FROM doc_tables WHERE collection = ? ORDER BY id",
+            (collection,),
+        ).fetchall()
+        cells = _conn.execute(
+            """SELECT c.table_id, c.row_index, c.column_index, c.value FROM table_cells c
+               JOIN doc_tables t ON t.id = c.table_id WHERE t.collection = ?""",
+            (collection,),
+        ).fetchall()
+
+    tables = {}
+    for table_id, page, columns, row_count, markdown in table_rows:
+        columns = json.loads(columns)
+        tables[table_id] = StoredTable(
+            table_id, page, columns, [[""] * len(columns) for _ in range(row_count)], markdown
+        )
+    for table_id, row_index, column_index, value in cells:
+        tables[table_id].rows[row_index][column_index] = value
+    return list(tables.values())
+
+
+def aggregate_column(table_id: int, column_index: int, skip_rows: List[int] = ()) -> Dict[str, float]:
+    skip = ",".join(str(int(r)) for r in skip_rows)
+    with _lock:
+        total, average, largest, smallest, count = _conn.execute(
+            f"""SELECT SUM(number), AVG(number), MAX(number), MIN(number), COUNT(number)
+                FROM table_cells WHERE table_id = ? AND column_index = ?
+                {f"AND row_index NOT IN ({skip})" if skip else ""}""",
+            (table_id, column_index),
+        ).fetchone()
+    return {"sum": total, "avg": average, "max": largest, "min": smallest, "count": count}
+
+
+def format_number(number: float) -> str:
+    if number == int(number):
+        return f"{int(number):,}"
+    return f"{number:,.2f}"
+
+
+def match_columns(table: StoredTable, question_words: set) -> List[Tuple[int, int]]:
+    """[(score, column_index)] of headers whose words all appear in the question"""
+    matches = []
+    for index, name in enumerate(table.columns):
+        name_words = content_words(name)
+        if name_words and name_words <= question_words:
+            matches.append((len(name_words), index))
+    return matches
+
+
+def match_rows(table: StoredTable, question_words: set) -> List[Tuple[int, int, int]]:
+    """
+    [(score, row_index, label_column)] of rows with a label cell whose words
+    all appear in the question. Label cells are the first column and any
+    non-numeric cell.
+    """
+    matches = []
+    for r, row in enumerate(table.rows):
+        best = None
+        for c, value in enumerate(row):
+            if c > 0 and parse_number(value) is not None:
+                continue
+            value_words = content_words(value)
+            if value_words and value_words <= question_words:
+                if best is None or len(value_words) > best[0]:
+                    best = (len(value_words), r, c)
+        if best:
+            matches.append(best)
+    return matches
+
+
+def is_lookup_question(question: str) -> bool:
+    """False for why/how/explain questions; 'how many' and 'how much' still ask for a value"""
+    question_words = words(question)
+    if EXPLANATORY_WORDS & set(question_words):
+        return False
+    return all(
+        i + 1 < len(question_words) and question_words[i + 1] in ("many", "much")
+        for i, word in enumerate(question_words) if word == "how"
+    )
+
+
+def coverage(matched: set, question_words: set) -> float:
+    """Share of the question's content words (table filler aside) the match accounts for"""
+    wanted = question_words - TABLE_FILLER
+    return len(wanted & matched) / len(wanted) if wanted else 1.0
+
+
+def detect_aggregate(question_words: set) -> Optional[str]:
+    for op, keywords in AGGREGATES.items():
+        if question_words & set(keywords):
+            return op
+    if {"how", "many"} <= question_words:
+        return "count"
+    return None
+
+
+def best(candidates: List[tuple]) -> Optional[tuple]:
+    """Highest scoring candidate; None when two different answers tie"""
+    if not candidates:
+        return None
+    candidates = sorted(candidates, key=lambda c: c[0], reverse=True)
+    if len(candidates) > 1 and candidates[1][0] == candidates[0][0] and candidates[1][1] != candidates[0][1]:
+        return None
+    return candidates[0]
+
+
+def lookup(collection: str, question: str, allow_row_answers: bool = False) -> Optional[dict]:
+    """
+    Answer a direct cell, row or aggregate question from the stored tables.
+    Returns {"answer", "table", "kind"} or None when no unambiguous answer exists.
+    Whole-row answers are only given when the caller already knows the
+    question is about tables (allow_row_answers). Answers whose header and
+    label words cover less than TABLE_MIN_COVERAGE of the question are dropped.
+    """
+    question_words = set(words(question))
+    op = detect_aggregate(question_words)
+    # Aggregate keywords must not count towards the aggregated column's header
+    aggregate_words = question_words - {k for keywords in AGGREGATES.values() for k in keywords}
+    op_words = question_words & set(AGGREGATES.get(op, ()))
+    wanted = content_words(question)
+
+    candidates = []  # (score, answer, table, kind, matched words)
+    for table in load_tables(collection):
+        columns = match_columns(table, question_words)
+        row = best(match_rows(table, question_words))
+
+        if row:
+            _, row_index, label_column = row
+            value_columns = [(s, i) for s, i in columns if i != label_column]
+            column = best(value_columns)
+            if column:
+                value = table.rows[row_index][column[1]]
+                if value:
+                    label = table.rows[row_index][label_column]
+                    answer = f"{table.columns[column[1]]} for {label}: {value}"
+                    matched = content_words(label) | content_words(table.columns[column[1]])
+                    candidates.append((row[0] + column[0] + 1, answer, table, "cell", matched))
+                continue
+            if allow_row_answers and not op:
+                values = "; ".join(
+                    f"{name}: {value}" for name, value in zip(table.columns, table.rows[row_index]) if value
+                )
+                matched = content_words(table.rows[row_index][label_column])
+                candidates.append((row[0], values, table, "row", matched))
+                continue
+
+        if op:
+            # The first column holds row labels (years, names), not measures
+            numeric = [
+                (score, index) for score, index in match_columns(table, aggregate_words)
+                if (index > 0 or len(table.columns) == 1)
+                and sum(parse_number(r[index]) is not None for r in table.rows) * 2 >= len(table.rows)
+            ]
+            column = best(numeric)
+            if not column:
+                continue
+            # Existing total rows would be counted twice
+            summary_rows = [r for r, row in enumerate(table.rows) if content_words(row[0]) & SUMMARY_LABELS]
+            stats = aggregate_column(table.id, column[1], summary_rows)
+            name = table.columns[column[1]]
+            if not stats["count"]:
+                continue
+            matched = content_words(name) | op_words
+            if op in ("max", "min"):
+                target = stats[op]
+                label_row = next(
+                    row for r, row in enumerate(table.rows)
+                    if r not in summary_rows and parse_number(row[column[1]]) == target
+                )
+                label = label_row[0] if column[1] != 0 else ""
+                answer = f"{'Highest' if op == 'max' else 'Lowest'} {name}: {format_number(target)}"
+                if label:
+                    answer += f" ({label})"
+                    # "Which office has the highest staff?" names the label column
+                    matched |= content_words(table.columns[0])
+            elif op == "count":
+                answer = f"Number of {name} values: {stats['count']}"
+            else:
+                answer = f"{'Total' if op == 'sum' else 'Average'} {name}: {format_number(stats[op])}"
+            candidates.append((column[0], answer, table, op, matched))
+
+    chosen = best([
+        (score, answer, table, kind) for score, answer, table, kind, matched in candidates
+        if coverage(matched, wanted) >= TABLE_MIN_COVERAGE
+    ])
+    if not chosen:
+        return None
+    _, answer, table, kind = chosen
+    return {"answer": answer, "table": table, "kind": kind}
@@ -0,0 +1,403 @@
+# telemetry.py - Structured logging, request tracing and Prometheus metrics
+
+import contextvars
+import json
+import logging
+import os
+import resource
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, List
+
+from fastapi import APIRouter, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from config import LOG_FILE, LOG_LEVEL
+
+router = APIRouter()
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Request ID of the HTTP request currently being served ("-" outside requests).
+# Starlette copies the context into threadpool workers and background tasks,
+# so ingestion running after the response still logs the upload's request ID.
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# Per-request trace: {"spans": {stage: seconds}, "attrs": {...}}
+_trace_var = contextvars.ContextVar("trace", default=None)
+
+# ========================================
+# Metrics
+# ========================================
+# Under serve.py every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# and /metrics aggregates all of them. Gauges whose value lives in shared
+# state (SQLite) are set by scrape hooks in the worker serving the scrape,
+# and the most recent write wins.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "docusleuth_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_DURATION = Histogram(
+    "docusleuth_stage_duration_seconds",
+    "Latency of individual pipeline stages",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+QUERY_REQUESTS = Counter(
+    "docusleuth_query_requests_total",
+    "Queries served",
+    ["query_type", "status"],
+)
+
+QUERY_DURATION = Histogram(
+    "docusleuth_query_duration_seconds",
+    "End-to-end /query latency",
+    ["query_type"],
+    buckets=LATENCY_BUCKETS,
+)
+
+QUERY_COALESCED = Counter(
+    "docusleuth_query_coalesced_total",
+    "Queries answered by joining an identical in-flight query",
+)
+
+RERANK_DECISIONS = Counter(
+    "docusleuth_rerank_decisions_total",
+    "Whether the rerank call was made or skipped on a decisive dense ranking",
+    ["decision"],
+)
+
+RERANK_SECONDS_SAVED = Counter(
+    "docusleuth_rerank_seconds_saved_total",
+    "Estimated rerank latency avoided by skipping (recent average rerank time per skip)",
+)
+
+CANDIDATES_RETRIEVED = Histogram(
+    "docusleuth_query_candidates_retrieved",
+    "Candidates returned by the vector search",
+    buckets=(0, 1, 2, 5, 10, 15, 20, 30, 50, 100),
+)
+
+DOCS_AFTER_THRESHOLD = Histogram(
+    "docusleuth_query_docs_after_threshold",
+    "Documents kept after reranking and relevance threshold",
+    buckets=(0, 1, 2, 3, 4, 5, 8, 10),
+)
+
+LLM_TOKENS = Counter(
+    "docusleuth_llm_tokens_total",
+    "LLM tokens consumed",
+    ["kind"],
+)
+
+TOKENS_GENERATED = Histogram(
+    "docusleuth_query_tokens_generated",
+    "Tokens generated per answer",
+    buckets=(0, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+
+CONTEXT_TOKENS = Histogram(
+    "docusleuth_query_context_tokens",
+    "Estimated tokens of the assembled generation context",
+    buckets=(0, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000),
+)
+
+TABLE_LOOKUPS = Counter(
+    "docusleuth_table_lookups_total",
+    "Table store lookups by outcome (hit = answered without the LLM)",
+    ["outcome"],
+)
+
+CONTEXT_TOKENS_SAVED = Counter(
+    "docusleuth_query_context_tokens_saved_total",
+    "Context tokens removed by chunk merging, deduplication and budgeting",
+)
+
+PROVIDER_CALLS = Counter(
+    "docusleuth_provider_calls_total",
+    "Calls to rate-limited providers by outcome (ok, throttled, rate_limited, error)",
+    ["provider", "outcome"],
+)
+
+PROVIDER_QUEUE_WAIT = Histogram(
+    "docusleuth_provider_queue_wait_seconds",
+    "Time spent queued for a provider quota token",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROVIDER_QUOTA_REMAINING = Gauge(
+    "docusleuth_provider_quota_remaining",
+    "Tokens left in each provider quota window",
+    ["provider", "window"],
+    multiprocess_mode="mostrecent",
+)
+
+RERANK_FALLBACKS = Counter(
+    "docusleuth_rerank_fallback_total",
+    "Queries that did not use Cohere reranking",
+    ["reason"],
+)
+
+UPLOAD_BYTES = Histogram(
+    "docusleuth_upload_size_bytes",
+    "Size of accepted uploads",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 32e6, 64e6, 128e6),
+)
+
+UPLOAD_REJECTED = Counter(
+    "docusleuth_upload_rejected_total",
+    "Uploads refused before ingestion",
+    ["reason"],
+)
+
+INGEST_DOCUMENTS = Counter(
+    "docusleuth_ingest_documents_total",
+    "Documents ingested",
+    ["status"],
+)
+
+INGEST_PAGES = Counter(
+    "docusleuth_ingest_pages_total",
+    "Pages processed during ingestion",
+)
+
+INGEST_OCR_PAGES = Counter(
+    "docusleuth_ingest_ocr_pages_total",
+    "Pages that went through OCR",
+)
+
+INGEST_CHUNKS = Counter(
+    "docusleuth_ingest_chunks_total",
+    "Chunks embedded and stored",
+)
+
+INGEST_DURATION = Histogram(
+    "docusleuth_ingest_duration_seconds",
+    "End-to-end ingestion latency per document",
+    buckets=LATENCY_BUCKETS,
+)
+
+SHARED_CACHE_REQUESTS = Counter(
+    "docusleuth_shared_cache_requests_total",
+    "Shared (cross-worker) cache lookups",
+    ["namespace", "result"],
+)
+
+REGISTERED_COLLECTIONS = Gauge(
+    "docusleuth_registered_collections",
+    "Collections tracked by the registry",
+    multiprocess_mode="mostrecent",
+)
+
+_scrape_hooks: List[Callable[[], None]] = []
+
+
+def on_scrape(hook: Callable[[], None]):
+    """Register a callback that refreshes gauges right before /metrics is rendered"""
+    _scrape_hooks.append(hook)
+
+COLLECTIONS_EVICTED = Counter(
+    "docusleuth_collections_evicted_total",
+    "Collections removed by GC or the admin endpoint",
+    ["mode"],
+)
+
+# ========================================
+# Structured logging
+# ========================================
+# color_message: uvicorn's ANSI-coloured copy of the message
+_RESERVED_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "color_message"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render log records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": request_id_var.get(),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+_logging_configured = False
+
+
+def configure_logging():
+    """Attach JSON handlers to the application and uvicorn loggers (idempotent)"""
+    global _logging_configured
+    if _logging_configured:
+        return
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # serve.py starts uvicorn without a log config; uvicorn.error and
+    # uvicorn.access then propagate to "uvicorn"
+    for name in ("docusleuth", "uvicorn"):
+        logger = logging.getLogger(name)
+        if name == "uvicorn" and logger.handlers:
+            continue  # Running under uvicorn's own log config
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+        for handler in handlers:
+            logger.addHandler(handler)
+
+    _logging_configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the application namespace, e.g. get_logger("query")"""
+    return logging.getLogger(f"docusleuth.{name}")
+
+
+# ========================================
+# Tracing
+# ========================================
+
+def start_trace() -> dict:
+    """Begin collecting spans for the current request"""
+    trace = {"spans": {}, "attrs": {}}
+    _trace_var.set(trace)
+    return trace
+
+
+def current_trace() -> dict:
+    trace = _trace_var.get()
+    if trace is None:
+        trace = start_trace()
+    return trace
+
+
+def trace_attr(key: str, value):
+    """Attach a value (candidate count, tokens, ...) to the current trace"""
+    current_trace()["attrs"][key] = value
+
+
+@contextmanager
+def span(stage: str, pipeline: str = "query"):
+    """
+    Time a pipeline stage, record it in the stage histogram and the current trace
+    """
+    trace = current_trace()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.labels(pipeline=pipeline, stage=stage).observe(elapsed)
+        spans = trace["spans"]
+        spans[stage] = round(spans.get(stage, 0.0) + elapsed, 4)
+
+
+def span_seconds(stage: str) -> float:
+    return current_trace()["spans"].get(stage, 0.0)
+
+
+# ========================================
+# Process resource usage
+# ========================================
+
+def process_io_snapshot() -> dict:
+    """
+    Peak RSS and bytes written to disk by this process so far (Linux).
+    Process-wide, so deltas are approximate when uploads overlap.
+    """
+    snapshot = {"rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "write_bytes":
+                    snapshot["disk_write_bytes"] = int(value)
+    except OSError:
+        pass
+    return snapshot
+
+
+def process_io_delta(start: dict) -> dict:
+    """Disk bytes written and peak RSS since `start` (see process_io_snapshot)"""
+    end = process_io_snapshot()
+    delta = {"rss_peak_mb": end["rss_peak_mb"]}
+    if "disk_write_bytes" in start and "disk_write_bytes" in end:
+        delta["disk_write_bytes"] = end["disk_write_bytes"] - start["disk_write_bytes"]
+    return delta
+
+
+# ========================================
+# HTTP integration
+# ========================================
+
+async def request_context_middleware(request: Request, call_next):
+    """Assign a request ID, log the request and record its latency"""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        path = getattr(route, "path", request.url.path)
+        # Unrouted paths (404s, scanners) share one label so they can't grow the series count
+        HTTP_REQUEST_DURATION.labels(
+            method=request.method, path=getattr(route, "path", "unmatched"), status=str(status)
+        ).observe(elapsed)
+        get_logger("http").info(
+            "request completed",
+            extra={
+                "method": request.method,
+                "path": path,
+                "status": status,
+                "duration_s": round(elapsed, 4),
+            },
+        )
+        request_id_var.reset(token)
+
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (all workers when PROMETHEUS_MULTIPROC_DIR is set)"""
+    for hook in _scrape_hooks:
+        try:
+            hook()
+        except Exception as e:
+            get_logger("metrics").warning("scrape hook failed", extra={"error": str(e)})
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,26 @@
+# tests/conftest.py - Run the tests against throwaway stores and stubbed services
+#
+#   cd backend/doc_backend
+#   python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+# config reads these at import
+for name in ("REGISTRY_DB_PATH", "TABLE_DB_PATH", "SHARED_CACHE_PATH", "JOB_DB_PATH", "QUOTA_DB_PATH"):
+    os.environ.setdefault(name, ":memory:")
+os.environ.setdefault("LOG_FILE", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with every external service stubbed (bench/stubs.py)"""
+    os.environ.setdefault("PARSE_WORKERS", "0")
+    from bench.stubs import StubLatency, install_stubs
+    from fastapi.testclient import TestClient
+    with TestClient(install_stubs(StubLatency())) as client:
+        yield client
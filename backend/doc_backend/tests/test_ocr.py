@@ -0,0 +1,34 @@
+# tests/test_ocr.py - OCR language validation and the per-process reader cache
+
+import pytest
+
+import ocr
+
+
+@pytest.mark.parametrize("languages", [["en"], ["en", "hi"], ["hi"], ["fr", "de", "en"], ["ru", "uk", "en"], ["ch_sim", "en"]])
+def test_supported_language_sets(languages):
+    assert ocr.language_error(languages) is None
+
+
+@pytest.mark.parametrize("languages, message", [
+    (["en", "xx"], "Unsupported OCR language(s): xx"),
+    (["hi", "fr"], "Devanagari OCR can only be combined with English, not fr"),
+    (["ja", "ko"], "Japanese OCR can only be combined with English, not ko"),
+    (["ar", "ru", "en"], "Arabic OCR can only be combined with English, not ru"),
+])
+def test_rejected_language_sets(languages, message):
+    assert ocr.language_error(languages) == message
+
+
+def test_readers_are_bounded(monkeypatch):
+    built = []
+    monkeypatch.setattr(ocr, "reader_factory", lambda languages: built.append(languages) or object())
+    monkeypatch.setattr(ocr, "_readers", ocr.OrderedDict())
+    monkeypatch.setattr(ocr, "OCR_MAX_READERS", 2)
+
+    en, hi = ocr.get_reader(("en",)), ocr.get_reader(("en", "hi"))
+    assert ocr.get_reader(("en",)) is en
+    ocr.get_reader(("fr",))  # evicts en,hi: en was used more recently
+    assert list(ocr._readers) == [("en",), ("fr",)]
+    assert ocr.get_reader(("en", "hi")) is not hi
+    assert len(built) == 4
@@ -0,0 +1,33 @@
+# tests/test_page_index.py - Page index existence cache
+
+import page_index
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.collections = set()
+        self.checks = 0
+
+    def collection_exists(self, name):
+        self.checks += 1
+        return name in self.collections
+
+
+def test_missing_index_is_rechecked(monkeypatch):
+    qdrant = FakeQdrant()
+    clock = [1000.0]
+    monkeypatch.setattr(page_index, "qdrant_client", qdrant)
+    monkeypatch.setattr(page_index.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(page_index, "PAGE_INDEX_CACHE", {})
+
+    assert not page_index.has_page_index("doc_a")
+    # Built by ingestion after the first query looked
+    qdrant.collections.add(page_index.page_collection("doc_a"))
+    assert not page_index.has_page_index("doc_a")
+    clock[0] += page_index.PAGE_INDEX_RECHECK_SECONDS
+    assert page_index.has_page_index("doc_a")
+
+    checks = qdrant.checks
+    clock[0] += 10 * page_index.PAGE_INDEX_RECHECK_SECONDS
+    assert page_index.has_page_index("doc_a")
+    assert qdrant.checks == checks
@@ -0,0 +1,21 @@
+# tests/test_shared_cache.py - Cached results around ingestion
+
+import registry
+from shared_cache import SharedCache
+
+
+def test_register_invalidates_partial_results():
+    cache = SharedCache("test", ttl=600)
+    registry.reserve_collection("doc_cache", "doc.pdf", None)
+    assert registry.is_ingesting("doc_cache")
+
+    # Cached by a query that ran over the first chunks only
+    cache.set("question", {"answer": "partial"}, tag="doc_cache")
+    registry.register_collection("doc_cache", "doc.pdf", None, points=10, vector_size=8, payload_bytes=100)
+
+    assert not registry.is_ingesting("doc_cache")
+    assert cache.get("question") is None
+
+
+def test_unregistered_collection_is_not_ingesting():
+    assert not registry.is_ingesting("never_seen")
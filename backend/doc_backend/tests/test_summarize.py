@@ -0,0 +1,47 @@
+# tests/test_summarize.py - Page-range summaries and their cache
+
+from bench.fixtures import FixtureSpec, make_pdf
+
+
+def upload(client, name: str, pages: int) -> str:
+    pdf = make_pdf(FixtureSpec(name, pages=pages))
+    response = client.post("/api/upload", files={"file": (f"{name}.pdf", pdf, "application/pdf")})
+    assert response.status_code == 200
+    # TestClient runs the background ingestion before returning
+    job = client.get(f"/api/jobs/{response.json()['job_id']}").json()
+    assert job["status"] == "completed", job
+    return response.json()["collection"]
+
+
+def test_page_range_loads_only_the_requested_pages(client):
+    import summarize
+    collection = upload(client, "range", pages=12)
+    assert sorted(summarize.load_page_texts(collection, 5, 8)) == [5, 6, 7, 8]
+    assert sorted(summarize.load_page_texts(collection, 10, None)) == [10, 11, 12]
+    assert len(summarize.load_page_texts(collection)) == 12
+
+
+def test_repeated_range_is_served_from_the_cache(client, monkeypatch):
+    import summarize
+    collection = upload(client, "repeat", pages=12)
+    body = {"collection": collection, "page_start": 5, "page_end": 8}
+
+    first = client.post("/api/summarize", json=body).json()
+    assert first["status"] == "success", first
+    assert (first["page_start"], first["page_end"], first["llm_calls"]) == (5, 8, 1)
+
+    def no_scroll(*args, **kwargs):
+        raise AssertionError("a cached range must not scroll the collection")
+    monkeypatch.setattr(summarize, "load_page_texts", no_scroll)
+    again = client.post("/api/summarize", json=body).json()
+    assert again["summary"] == first["summary"]
+    assert again["llm_calls"] == 0
+
+
+def test_empty_model_response_is_an_error(client, monkeypatch):
+    import query
+    collection = upload(client, "blocked", pages=4)
+    monkeypatch.setattr(query, "generate_text", lambda *args, **kwargs: (None, {}))
+    response = client.post("/api/summarize", json={"collection": collection}).json()
+    assert response["status"] == "error"
+    assert "no text" in response["message"]
@@ -0,0 +1,78 @@
+# tests/test_table_store.py - Table fast path: what it answers and what it must leave to the LLM
+
+import pytest
+
+from table_store import delete_tables, is_lookup_question, lookup, store_tables
+
+COLLECTION = "doc_test_tables"
+
+REVENUE = """| Year | Revenue | Profit |
+|---|---|---|
+| 2021 | 1,200 | 300 |
+| 2022 | 1,500 | 420 |
+| Total | 2,700 | 720 |"""
+
+OFFICES = """| Office | Revenue | Staff |
+|---|---|---|
+| North | 900 | 12 |
+| South | 600 | 8 |"""
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    store_tables(COLLECTION, [(1, REVENUE), (2, OFFICES)])
+    yield
+    delete_tables(COLLECTION)
+
+
+@pytest.mark.parametrize("question", [
+    "What was the revenue in 2021?",
+    "How many staff in the North office?",
+    "How much profit in 2022?",
+    "Show the data for South",
+])
+def test_lookup_questions(question):
+    assert is_lookup_question(question)
+
+
+@pytest.mark.parametrize("question", [
+    "Why did the company change its overall revenue strategy?",
+    "What does the report say about the maximum staff turnover allowed?",
+    "What did the North office say about revenue recognition?",
+    "How did revenue change in 2022?",
+    "Explain the profit figures",
+])
+def test_explanatory_questions(question):
+    assert not is_lookup_question(question)
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What was the revenue in 2021?", "Revenue for 2021: 1,200"),
+    ("What is the average profit?", "Average Profit: 360"),
+    ("What is the total profit?", "Profit for Total: 720"),
+    ("Which office has the highest staff?", "Highest Staff: 12 (North)"),
+    ("Revenue for North?", "Revenue for North: 900"),
+])
+def test_direct_lookups(question, answer):
+    result = lookup(COLLECTION, question, allow_row_answers=True)
+    assert result and result["answer"] == answer
+
+
+def test_row_answer():
+    result = lookup(COLLECTION, "Show the data for South", allow_row_answers=True)
+    assert result["kind"] == "row"
+    assert result["answer"] == "Office: South; Revenue: 600; Staff: 8"
+
+
+@pytest.mark.parametrize("question", [
+    "Why did the company change its overall revenue strategy?",
+    "What does the report say about the maximum staff turnover allowed?",
+    "What did the North office say about revenue recognition?",
+])
+def test_prose_questions_fall_through(question):
+    # Header and label words cover too little of these questions
+    assert lookup(COLLECTION, question, allow_row_answers=True) is None
+
+
+def test_unknown_collection():
+    assert lookup("doc_missing", "What was the revenue in 2021?") is None
@@ -0,0 +1,49 @@
+# tests/test_upload_batch.py - Batch uploads with unreadable zip members
+
+import io
+import zipfile
+
+from bench.fixtures import FixtureSpec, make_pdf
+
+
+def zip_with_bad_members(pdf: bytes) -> bytes:
+    """good.pdf, corrupt.pdf (invalid deflate data) and locked.pdf (flagged as encrypted)"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in ("good.pdf", "corrupt.pdf", "locked.pdf"):
+            archive.writestr(name, pdf)
+        infos = {info.filename: info for info in archive.infolist()}
+    data = bytearray(buffer.getvalue())
+
+    # First byte of the deflate stream: final block of the reserved type 11
+    corrupt = infos["corrupt.pdf"]
+    header = corrupt.header_offset
+    name_length = int.from_bytes(data[header + 26:header + 28], "little")
+    extra_length = int.from_bytes(data[header + 28:header + 30], "little")
+    data[header + 30 + name_length + extra_length] = 0xFF
+
+    # Encryption bit in the central directory entry, which is what zipfile checks
+    entry = data.rfind(b"locked.pdf") - 46  # The central directory comes after the members
+    data[entry + 8] |= 0x1
+    return bytes(data)
+
+
+def test_bad_members_are_rejected_and_the_rest_ingested(client):
+    pdf = make_pdf(FixtureSpec("batch", pages=2))
+    response = client.post(
+        "/api/upload/batch",
+        files=[("files", ("docs.zip", zip_with_bad_members(pdf), "application/zip")),
+               ("files", ("single.pdf", pdf, "application/pdf"))],
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (2, 2)
+    by_name = {job["filename"]: job for job in body["jobs"]}
+    assert by_name["corrupt.pdf"]["status"] == "rejected"
+    assert by_name["locked.pdf"]["status"] == "rejected"
+    assert "encrypted" in by_name["locked.pdf"]["error"]
+
+    # TestClient runs the background ingestion before returning
+    for name in ("good.pdf", "single.pdf"):
+        job = client.get(f"/api/jobs/{by_name[name]['job_id']}").json()
+        assert job["status"] == "completed", job
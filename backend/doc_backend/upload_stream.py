@@ -0,0 +1,189 @@
+# upload_stream.py - Streaming multipart receiver for the upload routes
+#
+# Starlette's form parser reads the whole request body before the handler
+# runs and spools files over 1 MB to temporary files, so size limits checked
+# in the handler only fire after a multi-GB body has been received and
+# written to disk. Here request.stream() is fed through python_multipart
+# chunk by chunk: file parts are hashed and counted as they arrive, a part
+# that breaks its limit is rejected (or dropped) at once, and nothing is
+# written to disk.
+
+import hashlib
+from typing import Dict, List, Optional
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect, Request
+
+MAX_FIELD_BYTES = 64 * 1024  # Plain form fields (e.g. languages)
+MULTIPART_OVERHEAD = 64 * 1024  # Boundaries, part headers and small fields around a file
+
+
+class UploadRejected(Exception):
+    """Upload refused before ingestion (too large, not a PDF, too many pages)"""
+
+    def __init__(self, status_code: int, reason: str, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.message = message
+
+
+class ReceivedFile:
+    """One file part: bytes, SHA-256 and size, or the error that rejected it"""
+
+    def __init__(self, field: str, filename: str):
+        self.field = field
+        self.filename = filename
+        self.data: Optional[bytearray] = bytearray()
+        self.size = 0
+        self.error: Optional[UploadRejected] = None
+        self.hasher = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        return self.hasher.hexdigest()
+
+
+def too_large(max_bytes: int, what: str = "File") -> UploadRejected:
+    return UploadRejected(413, "too_large", f"{what} exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+class MultipartReceiver:
+    """
+    Parser callbacks for one request. In strict mode the first rejected file
+    aborts the request; otherwise the file is marked rejected, its bytes are
+    dropped and parsing continues with the next part.
+    """
+
+    def __init__(self, max_file_bytes: int, magics: tuple, strict: bool):
+        self.max_file_bytes = max_file_bytes
+        self.magics = magics
+        self.magic_length = max(len(m) for m in magics)
+        self.strict = strict
+        self.fields: Dict[str, str] = {}
+        self.files: List[ReceivedFile] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._file: Optional[ReceivedFile] = None
+        self._field: Optional[str] = None
+        self._field_value = bytearray()
+        self._checked = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": lambda data, start, end: self._header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._header_value.extend(data[start:end]),
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def fail(self, error: UploadRejected):
+        if self.strict:
+            raise error
+        self._file.error = error
+        self._file.data = None
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._file = None
+        self._field = None
+        self._field_value = bytearray()
+        self._checked = False
+
+    def on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if b"filename" in options:
+            self._file = ReceivedFile(name, options[b"filename"].decode("utf-8", errors="replace"))
+            self.files.append(self._file)
+        else:
+            self._field = name
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        chunk = data[start:end]
+        if self._file is None:
+            if len(self._field_value) + len(chunk) > MAX_FIELD_BYTES:
+                raise UploadRejected(400, "invalid_form", f"Form field '{self._field}' is too large")
+            self._field_value.extend(chunk)
+            return
+        part = self._file
+        if part.error:
+            return
+        part.size += len(chunk)
+        if part.size > self.max_file_bytes:
+            self.fail(too_large(self.max_file_bytes))
+            return
+        part.hasher.update(chunk)
+        part.data.extend(chunk)
+        if not self._checked and len(part.data) >= self.magic_length:
+            self.check_magic()
+
+    def check_magic(self):
+        self._checked = True
+        if not self._file.data:
+            self.fail(UploadRejected(400, "empty", "Uploaded file is empty"))
+        elif not bytes(self._file.data[:self.magic_length]).startswith(self.magics):
+            self.fail(UploadRejected(415, "not_pdf", "Only PDF files are supported"))
+
+    def on_part_end(self):
+        if self._file is not None:
+            if not self._file.error and not self._checked:
+                self.check_magic()
+        elif self._field is not None:
+            self.fields[self._field] = self._field_value.decode("utf-8", errors="replace")
+
+
+def multipart_schema(file_field: str, many: bool = False) -> dict:
+    """openapi_extra for routes that read the multipart body themselves"""
+    file_schema = {"type": "string", "format": "binary"}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": [file_field],
+        "properties": {
+            file_field: {"type": "array", "items": file_schema} if many else file_schema,
+            "languages": {"type": "string", "description": "OCR languages, e.g. 'en,hi'"},
+        },
+    }}}}}
+
+
+async def receive_upload(request: Request, max_file_bytes: int, magics: tuple,
+                         max_body_bytes: Optional[int] = None, strict: bool = True):
+    """
+    Parse a multipart/form-data request from its byte stream.
+    Returns (fields, files). Raises UploadRejected as soon as the body
+    (declared or received) exceeds `max_body_bytes`, and, in strict mode,
+    as soon as a file breaks `max_file_bytes` or its magic bytes.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(400, "invalid_form", "Expected a multipart/form-data upload")
+
+    declared = request.headers.get("content-length")
+    if max_body_bytes and declared and declared.isdigit() and int(declared) > max_body_bytes:
+        raise too_large(max_body_bytes, "Upload")
+
+    receiver = MultipartReceiver(max_file_bytes, magics, strict)
+    parser = MultipartParser(params[b"boundary"], receiver.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_body_bytes and received > max_body_bytes:
+                raise too_large(max_body_bytes, "Upload")
+            parser.write(chunk)
+        parser.finalize()
+    except ClientDisconnect:
+        raise UploadRejected(400, "incomplete", "Upload was interrupted")
+    except MultipartParseError as e:
+        raise UploadRejected(400, "invalid_form", f"Malformed multipart body: {str(e)}")
+    return receiver.fields, receiver.files
@@ -1,300 +1,627 @@
-import os
+import contextvars
+import functools
+import hashlib
+import io
+import json
 import re
-import shutil
+import threading
+import time
 import uuid
-from pathlib import Path
-from typing import List, Dict
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional
 
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks
-from qdrant_client.models import PointStruct
+from fastapi import APIRouter, BackgroundTasks, Request
+from fastapi.responses import JSONResponse
+from qdrant_client.models import Distance, PointStruct, VectorParams
+from starlette.concurrency import run_in_threadpool
 
 import pymupdf as fitz
-import pymupdf4llm
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from easyocr import Reader
-ocr_reader = Reader(["en", "hi"], gpu=True)
-
-from embeddings import embedding_model, qdrant_client
-from gemini_embeddings import gemini_embed, GEMINI_VECTOR_DIM
+from config import (
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    MAX_BATCH_BYTES,
+    MAX_BATCH_FILES,
+    MAX_BATCH_TOTAL_BYTES,
+    MAX_UPLOAD_BYTES,
+    MAX_UPLOAD_PAGES,
+    PAGE_INDEX_MIN_PAGES,
+    PARSE_WORKERS,
+)
+from embeddings import embedding_dimension, embedding_model, qdrant_client
+from jobs import create_job, get_job, update_job
+from ocr import language_error, recognize_pages
+from page_index import PageVectorSums, build_page_index, index_chunk_pages
+from pdf_parse import extract_tables_from_text, parse_pdf, smart_chunk_text
+from pdf_parse import get_pool as get_parse_pool
+from pdf_parse import shutdown_pool as shutdown_parse_pool
+from registry import drop_collection, register_collection, reserve_collection
+from table_store import store_tables
+from telemetry import (
+    INGEST_CHUNKS,
+    INGEST_DOCUMENTS,
+    INGEST_DURATION,
+    INGEST_OCR_PAGES,
+    INGEST_PAGES,
+    UPLOAD_BYTES,
+    UPLOAD_REJECTED,
+    get_logger,
+    process_io_delta,
+    process_io_snapshot,
+    span,
+    start_trace,
+)
+from upload_stream import MULTIPART_OVERHEAD, UploadRejected, multipart_schema, receive_upload
 
 
 router = APIRouter()
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+logger = get_logger("ingest")
 
 # --- Configuration ---
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
-MIN_TEXT_FOR_OCR = 50  # If page has less text, try OCR
-
-# --- Helper Functions ---
-
-def extract_images_from_page(pdf_doc, page_index):
-    """Extract all images from a specific PDF page"""
-    page = pdf_doc[page_index]
-    images = []
-    for img in page.get_images(full=True):
-        xref = img[0]
-        base_image = pdf_doc.extract_image(xref)
-        image_bytes = base_image.get("image")
-        if image_bytes:
-            images.append(image_bytes)
-    return images
-
-def ocr_images(image_bytes_list):
-    """Perform OCR on list of image bytes"""
-    full_text = ""
-    for img_bytes in image_bytes_list:
-        try:
-            ocr_output = ocr_reader.readtext(img_bytes, detail=0)
-            if ocr_output:
-                full_text += " ".join(ocr_output) + "\n"
-        except Exception as e:
-            print(f"[WARNING] OCR failed for an image: {e}")
-    return full_text.strip()
+MAX_OCR_LANGUAGES = 5
+OCR_LANGUAGE_CODE = re.compile(r"^[a-z]{2,3}(_[a-z]{2,10})?$")
 
-def detect_tables_in_text(text: str) -> bool:
-    """Check if text contains markdown tables"""
-    # Look for markdown table patterns
-    lines = text.split('\n')
-    table_row_count = sum(1 for line in lines if '|' in line and line.strip().startswith('|'))
-    return table_row_count >= 2  # At least header + one data row
+# --- Main Processing Function ---
 
-def extract_tables_from_text(text: str) -> List[str]:
-    """Extract complete markdown tables from text"""
-    tables = []
-    lines = text.split('\n')
-    current_table = []
-    in_table = False
+def extract_chunks(data: bytes, filename: str, ocr_languages: Optional[List[str]] = None, parsed: dict = None):
+    """
+    Parse, OCR and chunk one PDF with improved table handling.
+    `parsed` is parse_pdf()'s result when the parse already ran in the pool.
+    Returns (chunks, page_count, ocr_page_count).
+    """
+    if parsed is None:
+        with span("extract", pipeline="ingest"):
+            parsed = parse_pdf(data, filename)
     
-    for line in lines:
-        if '|' in line and line.strip().startswith('|'):
-            in_table = True
-            current_table.append(line)
-        elif in_table:
-            if line.strip() == '' or not line.strip().startswith('|'):
-                # Table ended
-                if len(current_table) >= 2:  # Valid table
-                    tables.append('\n'.join(current_table))
-                current_table = []
-                in_table = False
+    # OCR every page that appears to be scanned/image-only in one go,
+    # so the pages can be batched and spread over the OCR processes
+    scanned = parsed["scanned"]
+    ocr_texts = {}
+    if scanned:
+        logger.info("pages have minimal text, running OCR", extra={"pages": len(scanned), "languages": ocr_languages})
+        with span("ocr", pipeline="ingest"):
+            with fitz.open(stream=data, filetype="pdf") as pdf_doc:
+                ocr_texts = recognize_pages(pdf_doc, [page - 1 for page in scanned], ocr_languages)
     
-    # Handle case where table is at the end
-    if current_table and len(current_table) >= 2:
-        tables.append('\n'.join(current_table))
+    all_chunks = []
+    
+    for page_num in sorted(set(parsed["chunks"]) | set(scanned)):
+        ocr_text = ""
+        if page_num in scanned:
+            page_text = scanned[page_num]
+            ocr_text = ocr_texts.get(page_num - 1, "")
+            if ocr_text:
+                page_text = page_text + "\n\n" + ocr_text
+            
+            # Smart chunking that preserves tables
+            with span("chunk", pipeline="ingest"):
+                page_chunks = smart_chunk_text(page_text, page_num, filename)
+        else:
+            page_chunks = parsed["chunks"][page_num]
+        
+        # Add OCR flag to metadata
+        for chunk in page_chunks:
+            chunk["metadata"]["ocr_used"] = bool(ocr_text)
+        
+        all_chunks.extend(page_chunks)
     
+    INGEST_PAGES.inc(parsed["pages"])
+    INGEST_OCR_PAGES.inc(len(scanned))
+    return all_chunks, parsed["pages"], len(scanned)
+
+def collect_tables(chunks: List[Dict]) -> List[tuple]:
+    """Distinct (page, markdown) tables contained in the chunks, in page order"""
+    tables = []
+    seen = set()
+    for chunk in chunks:
+        if not chunk["metadata"].get("has_table"):
+            continue
+        page = chunk["metadata"].get("page")
+        for table in extract_tables_from_text(chunk["text"]):
+            if (page, table) not in seen:
+                seen.add((page, table))
+                tables.append((page, table))
     return tables
 
-def smart_chunk_text(text: str, page_num: int, filename: str) -> List[Dict]:
+def create_collection(collection_name: str, vector_size: int):
+    """Create (or replace) the Qdrant collection for one document"""
+    if qdrant_client.collection_exists(collection_name):
+        qdrant_client.delete_collection(collection_name)
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+    )
+
+def embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
     """
-    Smart chunking that preserves tables intact and splits regular text
+    Embed a batch in one call; if the batch fails, retry text by text so a
+    single bad chunk only loses itself (its slot is None).
     """
-    chunks = []
+    try:
+        with span("embed", pipeline="ingest"):
+            return embedding_model.embed_documents(texts)
+    except Exception as e:
+        logger.warning("batch embedding failed, retrying per chunk", extra={"size": len(texts), "error": str(e)})
     
-    # First, extract any tables
-    tables = extract_tables_from_text(text)
+    vectors = []
+    for text in texts:
+        try:
+            with span("embed", pipeline="ingest"):
+                vectors.append(embedding_model.embed_query(text))
+        except Exception as e:
+            logger.error("failed to embed chunk", extra={"error": str(e)})
+            vectors.append(None)
+    return vectors
+
+class IngestionPipeline:
+    """
+    Shared ingestion path for one or many PDFs.
     
-    # Remove tables from text temporarily to chunk the rest
-    text_without_tables = text
-    for table in tables:
-        text_without_tables = text_without_tables.replace(table, f"\n[TABLE_PLACEHOLDER_{len(chunks)}]\n")
+    Documents are parsed ahead in the parse process pool (parse_documents)
+    and added one after another. Their chunks go into a shared buffer that
+    is cut into EMBED_BATCH_SIZE batches, regardless of which file they came
+    from. Each batch is embedded on a small thread pool, so network-bound
+    embedding overlaps with parsing, and upserted in bulk per collection.
+    A document's job completes when its last chunk has been stored.
+    """
     
-    # Chunk the non-table text
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    text_chunks = splitter.split_text(text_without_tables)
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY)
+        self.pending = []  # [(job, point_id, chunk)]
+        self.futures = []
+        self.lock = threading.Lock()
+        self.progress = {}  # job_id -> {"total", "done", "stored", "started", "pages", "ocr_pages", "payload_bytes", "page_sums"}
     
-    # Process each text chunk
-    for chunk in text_chunks:
-        # Check if this chunk contains table placeholders
-        table_placeholders = re.findall(r'\[TABLE_PLACEHOLDER_(\d+)\]', chunk)
+    def add_document(self, job: dict, data: bytes, parsed):
+        """`parsed` is parse_pdf()'s result, or the exception it raised"""
+        job_id = job["job_id"]
+        update_job(job_id, status="processing")
+        started = time.perf_counter()
+        try:
+            if isinstance(parsed, Exception):
+                raise parsed
+            chunks, pages, ocr_pages = extract_chunks(data, job["filename"], job.get("ocr_languages"), parsed)
+            if chunks:
+                # Reserved first, so a failure below always has an owner to clean up
+                reserve_collection(job["collection"], job["filename"], job.get("sha256"))
+                create_collection(job["collection"], embedding_dimension())
+                if pages >= PAGE_INDEX_MIN_PAGES:
+                    index_chunk_pages(job["collection"])
+        except Exception as e:
+            self._fail(job, f"Failed to process PDF: {str(e)}")
+            return
         
-        if table_placeholders:
-            # Replace placeholders with actual tables
-            for placeholder_idx in table_placeholders:
-                idx = int(placeholder_idx)
-                if idx < len(tables):
-                    chunk = chunk.replace(f"[TABLE_PLACEHOLDER_{idx}]", tables[idx])
+        if not chunks:
+            INGEST_DOCUMENTS.labels(status="empty").inc()
+            update_job(job_id, status="failed", error="No text could be extracted from the PDF", pages=pages)
+            logger.error("no chunks created from PDF", extra={"file": job["filename"]})
+            return
         
-        if chunk.strip():
-            chunks.append({
-                "text": chunk,
-                "metadata": {
-                    "page": page_num,
-                    "source": filename,
-                    "has_table": detect_tables_in_text(chunk),
-                    "chunk_type": "mixed" if detect_tables_in_text(chunk) else "text"
-                }
-            })
-    
-    # Add standalone tables that weren't included in text chunks
-    for i, table in enumerate(tables):
-        # Check if this table was already included in a chunk
-        table_included = any(table in chunk["text"] for chunk in chunks)
-        if not table_included:
-            chunks.append({
-                "text": table,
-                "metadata": {
-                    "page": page_num,
-                    "source": filename,
-                    "has_table": True,
-                    "chunk_type": "table_only"
-                }
-            })
+        try:
+            with span("tables", pipeline="ingest"):
+                tables_stored = store_tables(job["collection"], collect_tables(chunks))
+        except Exception as e:
+            tables_stored = 0
+            logger.warning("failed to store tables", extra={"collection": job["collection"], "error": str(e)})
+        
+        update_job(job_id, pages=pages, ocr_pages=ocr_pages, chunks=len(chunks), tables=tables_stored)
+        payload_bytes = sum(
+            len(chunk["text"].encode("utf-8")) + len(json.dumps(chunk["metadata"])) for chunk in chunks
+        )
+        with self.lock:
+            self.progress[job_id] = {
+                "total": len(chunks), "done": 0, "stored": 0,
+                "started": started, "pages": pages, "ocr_pages": ocr_pages,
+                "payload_bytes": payload_bytes,
+                # Page vectors are accumulated only for documents that get a page index
+                "page_sums": PageVectorSums() if pages >= PAGE_INDEX_MIN_PAGES else None,
+            }
+        for point_id, chunk in enumerate(chunks):
+            self.pending.append((job, point_id, chunk))
+            if len(self.pending) >= EMBED_BATCH_SIZE:
+                self._flush()
     
-    return chunks
-
-# --- Main Processing Function ---
-
-def create_embeddings_from_pdf(filepath: Path, filename: str, collection_name: str):
-    """Process PDF and create embeddings with improved table handling"""
-    print(f"[INFO] Processing PDF: {filepath}")
+    def _flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            # Each task runs in its own copy of the context (request ID, trace)
+            context = contextvars.copy_context()
+            self.futures.append(self.executor.submit(context.run, self._embed_and_store, batch))
     
-    try:
-        # Extract markdown with page chunks
-        md_pages = pymupdf4llm.to_markdown(str(filepath), page_chunks=True)
+    def _embed_and_store(self, batch):
+        vectors = embed_texts([chunk["text"] for _, _, chunk in batch])
         
-        # Open PDF for OCR if needed
-        pdf_doc = fitz.open(filepath)
-        
-        all_chunks = []
-        
-        for page_data in md_pages:
-            page_text = page_data["text"]
-            page_num = page_data["metadata"]["page"]
-            
-            # Perform OCR if page appears to be scanned/image-only
-            ocr_text = ""
-            if len(page_text.strip()) < MIN_TEXT_FOR_OCR:
-                print(f"[INFO] Page {page_num} has minimal text, attempting OCR...")
-                images = extract_images_from_page(pdf_doc, page_num - 1)
-                ocr_text = ocr_images(images)
-                if ocr_text:
-                    page_text = page_text + "\n\n" + ocr_text
-            
-            # Smart chunking that preserves tables
-            page_chunks = smart_chunk_text(page_text, page_num, filename)
-            
-            # Add OCR flag to metadata
-            for chunk in page_chunks:
-                chunk["metadata"]["ocr_used"] = bool(ocr_text)
-            
-            all_chunks.extend(page_chunks)
+        by_collection = {}
+        for (job, point_id, chunk), vector in zip(batch, vectors):
+            if vector is None:
+                continue
+            by_collection.setdefault(job["collection"], []).append(
+                PointStruct(
+                    id=point_id,
+                    vector=vector,
+                    payload={
+                        "page_content": chunk["text"],
+                        "metadata": chunk["metadata"]
+                    }
+                )
+            )
         
-        pdf_doc.close()
+        stored_collections = set()
+        for collection_name, points in by_collection.items():
+            try:
+                with span("upsert", pipeline="ingest"):
+                    qdrant_client.upsert(collection_name, points=points)
+                stored_collections.add(collection_name)
+            except Exception as e:
+                logger.error("bulk upsert failed", extra={"collection": collection_name, "points": len(points), "error": str(e)})
         
-        print(f"[INFO] Total chunks prepared: {len(all_chunks)}")
+        # Per-page vector sums of this batch, merged into the job under the lock
+        batch_sums = {}
+        for (job, _, chunk), vector in zip(batch, vectors):
+            if vector is None or job["collection"] not in stored_collections:
+                continue
+            if self.progress[job["job_id"]]["page_sums"] is not None:
+                batch_sums.setdefault(job["job_id"], PageVectorSums()).add(chunk["metadata"]["page"], vector)
         
-        if not all_chunks:
-            print("[ERROR] No chunks created from PDF")
+        finished = []
+        with self.lock:
+            for job_id, sums in batch_sums.items():
+                self.progress[job_id]["page_sums"].merge(sums)
+            for (job, _, _), vector in zip(batch, vectors):
+                progress = self.progress[job["job_id"]]
+                progress["done"] += 1
+                if vector is not None and job["collection"] in stored_collections:
+                    progress["stored"] += 1
+                if progress["done"] == progress["total"]:
+                    finished.append(job)
+        for job in finished:
+            self._complete(job)
+    
+    def _complete(self, job: dict):
+        progress = self.progress[job["job_id"]]
+        if progress["stored"] == 0:
+            self._fail(job, "No chunks could be embedded and stored")
             return
         
-        # Verify embedding model dimensions
-        sample_embedding = embedding_model.embed_query("test")
-        vector_size = len(sample_embedding)
-        print(f"[INFO] Detected embedding dimension: {vector_size}")
-        
-        # vector_size = GEMINI_VECTOR_DIM
-        # print(f"[INFO] Gemini embedding dimension: {vector_size}")
-
+        page_points = 0
+        if progress["page_sums"] is not None:
+            try:
+                with span("page_index", pipeline="ingest"):
+                    page_points = build_page_index(job["collection"], progress["page_sums"])
+            except Exception as e:
+                # Queries fall back to the flat chunk search
+                logger.warning("failed to build page index", extra={"collection": job["collection"], "error": str(e)})
         
-        # Create Qdrant collection
-        qdrant_client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config={"size": vector_size, "distance": "Cosine"}
+        elapsed = time.perf_counter() - progress["started"]
+        INGEST_CHUNKS.inc(progress["stored"])
+        INGEST_DOCUMENTS.labels(status="ok").inc()
+        INGEST_DURATION.observe(elapsed)
+        register_collection(
+            job["collection"], job["filename"], job.get("sha256"),
+            points=progress["stored"],
+            vector_size=embedding_dimension(),
+            payload_bytes=progress["payload_bytes"],
+            index_vectors=page_points,
         )
-        
-        # Batch insert into Qdrant
-        points = []
-        batch_size = 50
-        
-        for i, chunk_data in enumerate(all_chunks):
+        update_job(job["job_id"], status="completed", chunks_stored=progress["stored"])
+        logger.info(
+            "collection created",
+            extra={
+                "collection": job["collection"],
+                "file": job["filename"],
+                "chunks": progress["stored"],
+                "pages": progress["pages"],
+                "ocr_pages": progress["ocr_pages"],
+                "indexed_pages": page_points,
+                "duration_s": round(elapsed, 4),
+            },
+        )
+    
+    def _fail(self, job: dict, message: str):
+        INGEST_DOCUMENTS.labels(status="error").inc()
+        if job["collection"]:
             try:
-                emb = embedding_model.embed_query(chunk_data["text"])
-
-                
-                points.append(
-                    PointStruct(
-                        id=i,
-                        vector=emb,
-                        payload={
-                            "page_content": chunk_data["text"],
-                            "metadata": chunk_data["metadata"]
-                        }
-                    )
-                )
-                
-                # Batch upload
-                if len(points) >= batch_size:
-                    qdrant_client.upsert(collection_name, points=points)
-                    print(f"[INFO] Uploaded batch of {len(points)} points")
-                    points = []
-                    
+                # Points, page index and tables stored so far go with the reservation
+                drop_collection(job["collection"])
             except Exception as e:
-                print(f"[ERROR] Failed to embed chunk {i}: {e}")
-                continue
-        
-        # Upload remaining points
-        if points:
-            qdrant_client.upsert(collection_name, points=points)
-            print(f"[INFO] Uploaded final batch of {len(points)} points")
-        
-        print(f"[SUCCESS] Collection '{collection_name}' created with {len(all_chunks)} chunks")
+                logger.warning("failed to clean up collection", extra={"collection": job["collection"], "error": str(e)})
+        update_job(job["job_id"], status="failed", error=message)
+        logger.error("ingestion failed", extra={"file": job["filename"], "collection": job["collection"], "error": message})
+    
+    def finish(self):
+        """Flush the last partial batch and wait for every embedding task"""
+        self._flush()
+        for future in self.futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.exception("embedding task failed", extra={"error": str(e)})
+        self.executor.shutdown()
         
-    except Exception as e:
-        print(f"[ERROR] Failed to process PDF: {e}")
-        raise
+        with self.lock:
+            unfinished = [job_id for job_id, p in self.progress.items() if p["done"] < p["total"]]
+        for job_id in unfinished:
+            job = get_job(job_id)
+            if job and job["status"] == "processing":
+                self._fail(job, "Ingestion did not complete")
+
+def parse_documents(items: deque):
+    """
+    Yield (job, data, parsed) in upload order while up to two documents per
+    parse process are parsed ahead. `parsed` is the exception when parsing
+    failed. Items are popped as they are submitted, so a document's bytes
+    are released once it has been ingested.
+    """
+    if PARSE_WORKERS <= 0:
+        while items:
+            job, data = items.popleft()
+            try:
+                with span("extract", pipeline="ingest"):
+                    parsed = parse_pdf(data, job["filename"])
+            except Exception as e:
+                parsed = e
+            yield job, data, parsed
+        return
+    
+    pending = deque()
+    while items or pending:
+        while items and len(pending) < 2 * PARSE_WORKERS:
+            job, data = items.popleft()
+            pending.append((job, data, get_parse_pool().submit(parse_pdf, data, job["filename"])))
+        job, data, future = pending.popleft()
+        try:
+            with span("extract", pipeline="ingest"):
+                parsed = future.result()
+        except BrokenProcessPool as e:
+            logger.error("parse worker died, restarting pool", extra={"error": str(e)})
+            shutdown_parse_pool()
+            parsed = e
+        except Exception as e:
+            parsed = e
+        yield job, data, parsed
 
-def cleanup_file(filepath: Path):
-    """Remove temporary file"""
+def ingest_documents(items: List[tuple]):
+    """
+    Ingest [(job, pdf_bytes), ...] through one shared pipeline.
+    The list is emptied as documents are taken; jobs that were never
+    processed are marked failed.
+    """
+    trace = start_trace()
+    ingest_start = time.perf_counter()
+    io_start = process_io_snapshot()
+    jobs = [job for job, _ in items]
+    queue = deque(items)
+    items.clear()
+    processed = set()
+    pipeline = IngestionPipeline()
+    try:
+        for job, data, parsed in parse_documents(queue):
+            logger.info(
+                "processing PDF",
+                extra={"file": job["filename"], "collection": job["collection"], "sha256": job.get("sha256")},
+            )
+            processed.add(job["job_id"])
+            pipeline.add_document(job, data, parsed)
+    finally:
+        pipeline.finish()
+        for job in jobs:
+            if job["job_id"] not in processed:
+                update_job(job["job_id"], status="failed", error="Ingestion aborted")
+    
+    logger.info(
+        "ingestion finished",
+        extra={
+            "documents": len(jobs),
+            "duration_s": round(time.perf_counter() - ingest_start, 4),
+            "spans": trace["spans"],
+            **process_io_delta(io_start),
+        },
+    )
+
+# --- Streaming Upload ---
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+# Corrupt deflate data, encrypted members and unsupported compression methods
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError)
+
+def parse_ocr_languages(value: Optional[str]) -> Optional[List[str]]:
+    """'en,hi' -> ['en', 'hi']; None/empty means the configured default"""
+    if not value or not value.strip():
+        return None
+    languages = [code.strip().lower() for code in value.split(",") if code.strip()]
+    if len(languages) > MAX_OCR_LANGUAGES or not all(OCR_LANGUAGE_CODE.match(code) for code in languages):
+        raise UploadRejected(
+            400, "invalid_languages",
+            f"languages must be up to {MAX_OCR_LANGUAGES} comma-separated OCR language codes, e.g. 'en,hi'"
+        )
+    # Refused here rather than by the OCR worker after the upload was accepted
+    error = language_error(languages)
+    if error:
+        raise UploadRejected(400, "invalid_languages", error)
+    return languages
+
+def check_pdf(buffer: bytes) -> int:
+    """
+    Open the PDF from memory to validate it and enforce MAX_UPLOAD_PAGES.
+    Returns the page count; the document itself is opened again, in the
+    parse pool, only when the pipeline gets to it.
+    """
     try:
-        if filepath.exists():
-            os.remove(filepath)
-            print(f"[INFO] Removed temporary file: {filepath}")
+        with fitz.open(stream=buffer, filetype="pdf") as pdf_doc:
+            pages = pdf_doc.page_count
     except Exception as e:
-        print(f"[WARNING] Failed to cleanup file {filepath}: {e}")
+        raise UploadRejected(422, "invalid_pdf", f"Could not open PDF: {str(e)}")
+    if pages > MAX_UPLOAD_PAGES:
+        raise UploadRejected(413, "too_many_pages", f"PDF has {pages} pages, the limit is {MAX_UPLOAD_PAGES}")
+    return pages
 
 # --- API Endpoint ---
 
-@router.post("/upload")
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
-):
-    """Upload PDF and process in background"""
-    
-    # Save file with unique name
-    filepath = UPLOAD_DIR / f"{uuid.uuid4().hex}_{file.filename}"
-    
+@router.post("/upload", openapi_extra=multipart_schema("file"))
+async def upload_file(request: Request, background_tasks: BackgroundTasks):
+    """
+    Upload PDF and process in background (form fields: file, and optionally
+    languages: OCR languages, e.g. 'en,hi'). The body is parsed as it
+    streams in, so an oversized file is refused after MAX_UPLOAD_BYTES.
+    """
+    filename = None
     try:
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Failed to save file: {str(e)}"
-        }
+        fields, files = await receive_upload(
+            request, MAX_UPLOAD_BYTES, (PDF_MAGIC,), MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+        )
+        file = next((f for f in files if f.field == "file"), None)
+        if file is None:
+            raise UploadRejected(422, "missing_file", "No file uploaded (form field 'file')")
+        filename = file.filename
+        ocr_languages = parse_ocr_languages(fields.get("languages"))
+        pages = await run_in_threadpool(check_pdf, file.data)
+    except UploadRejected as e:
+        UPLOAD_REJECTED.labels(reason=e.reason).inc()
+        logger.warning("upload rejected", extra={"file": filename, "reason": e.reason})
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"status": "error", "message": e.message}
+        )
     
+    buffer, source_hash = file.data, file.sha256
+    UPLOAD_BYTES.observe(len(buffer))
     unique_collection = f"doc_{uuid.uuid4().hex}"
-    
-    # Start background processing
-    background_tasks.add_task(
-        create_embeddings_from_pdf, 
-        filepath, 
-        file.filename, 
-        unique_collection
+    job = create_job(
+        file.filename, unique_collection,
+        sha256=source_hash, size_bytes=len(buffer), pages=pages,
+        ocr_languages=ocr_languages
     )
     
-    # Cleanup after processing
-    background_tasks.add_task(cleanup_file, filepath)
+    # Start background processing
+    background_tasks.add_task(ingest_documents, [(job, buffer)])
     
     return {
         "status": "success",
         "message": "File uploaded successfully. Processing started in background.",
         "collection": unique_collection,
-        "filename": file.filename
-    }
\ No newline at end of file
+        "job_id": job["job_id"],
+        "filename": file.filename,
+        "size_bytes": len(buffer),
+        "pages": pages,
+        "sha256": source_hash
+    }
+
+def expand_upload(filename: str, buffer: bytearray) -> List[tuple]:
+    """
+    Turn one uploaded file into [(filename, size, read), ...]: a PDF as
+    itself, a zip archive as its PDF members. read() returns the bytes, so
+    members that break a limit are never decompressed.
+    """
+    if not buffer.startswith(ZIP_MAGIC):
+        return [(filename, len(buffer), lambda: buffer)]
+    
+    archive = zipfile.ZipFile(io.BytesIO(buffer))
+    return [
+        (info.filename.rsplit("/", 1)[-1], info.file_size, functools.partial(archive.read, info))
+        for info in archive.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(".pdf")
+    ]
+
+@router.post("/upload/batch", openapi_extra=multipart_schema("files", many=True))
+async def upload_batch(request: Request, background_tasks: BackgroundTasks):
+    """
+    Upload many PDFs (or zip archives of PDFs) in one request (form field
+    `files`, repeated). Each PDF gets its own collection and job; all of them
+    are ingested by one shared pipeline with cross-file embedding batches.
+    `languages` (OCR languages) applies to every file of the batch.
+    A file over MAX_BATCH_BYTES is dropped as it streams in and rejected;
+    the request, and the PDFs extracted from it, are held to MAX_BATCH_TOTAL_BYTES.
+    Jobs are only created once every file has been checked, so a failure
+    while checking cannot leave accepted jobs without an ingestion task.
+    """
+    try:
+        fields, files = await receive_upload(
+            request, MAX_BATCH_BYTES, (PDF_MAGIC, ZIP_MAGIC), MAX_BATCH_TOTAL_BYTES, strict=False
+        )
+        ocr_languages = parse_ocr_languages(fields.get("languages"))
+    except UploadRejected as e:
+        UPLOAD_REJECTED.labels(reason=e.reason).inc()
+        return JSONResponse(status_code=e.status_code, content={"status": "error", "message": e.message})
+    
+    batch_id = uuid.uuid4().hex
+    results = []  # In upload order: (name, None, message) when rejected, else (name, data, pages)
+    accepted = 0
+    budget = MAX_BATCH_TOTAL_BYTES  # Bytes of extracted PDFs still allowed
+    
+    def reject(name: str, reason: str, message: str):
+        UPLOAD_REJECTED.labels(reason=reason).inc()
+        results.append((name, None, message))
+    
+    for upload in files:
+        if upload.field != "files":
+            continue
+        if upload.error:
+            reject(upload.filename, upload.error.reason, upload.error.message)
+            continue
+        try:
+            documents = await run_in_threadpool(expand_upload, upload.filename, upload.data)
+        except ARCHIVE_ERRORS as e:
+            reject(upload.filename, "invalid_archive", f"Could not read archive: {str(e)}")
+            continue
+        finally:
+            upload.data = None  # Archives are only read through their members from here on
+        
+        for name, size, read in documents:
+            if accepted >= MAX_BATCH_FILES:
+                reject(name, "batch_limit", f"Batch is limited to {MAX_BATCH_FILES} files")
+                continue
+            if size > MAX_UPLOAD_BYTES:
+                reject(name, "too_large", f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+                continue
+            if size > budget:
+                reject(name, "batch_too_large", f"Batch exceeds the {MAX_BATCH_TOTAL_BYTES // (1024 * 1024)} MB total limit")
+                continue
+            try:
+                data = await run_in_threadpool(read)
+                pages = await run_in_threadpool(check_pdf, data)
+            except UploadRejected as e:
+                reject(name, e.reason, e.message)
+                continue
+            except ARCHIVE_ERRORS as e:
+                reject(name, "invalid_archive", f"Could not read archive member: {str(e)}")
+                continue
+            budget -= len(data)
+            accepted += 1
+            UPLOAD_BYTES.observe(len(data))
+            results.append((name, data, pages))
+    
+    items = []
+    jobs = []
+    for name, data, detail in results:
+        if data is None:
+            jobs.append(create_job(name, None, batch_id, status="rejected", error=detail))
+            continue
+        job = create_job(
+            name, f"doc_{uuid.uuid4().hex}", batch_id,
+            sha256=hashlib.sha256(data).hexdigest(), size_bytes=len(data), pages=detail,
+            ocr_languages=ocr_languages
+        )
+        items.append((job, data))
+        jobs.append(job)
+    results.clear()
+    
+    if items:
+        background_tasks.add_task(ingest_documents, items)
+    
+    logger.info("batch accepted", extra={"batch_id": batch_id, "accepted": len(items), "rejected": len(jobs) - len(items)})
+    return {
+        "status": "success" if items else "error",
+        "message": f"{len(items)} file(s) accepted for processing.",
+        "batch_id": batch_id,
+        "accepted": len(items),
+        "rejected": len(jobs) - len(items),
+        "jobs": [
+            {key: job.get(key) for key in ("job_id", "filename", "collection", "status", "error")}
+            for job in jobs
+        ]
+    }